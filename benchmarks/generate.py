@@ -0,0 +1,117 @@
+"""Fill a nova instance with synthetic users, datasets and files.
+
+Used by the benchmarks but can also be run on its own to get a populated
+instance for manual testing:
+
+    $ NOVA_SETTINGS=nova.cfg python benchmarks/generate.py --users 10 --datasets 50
+"""
+import os
+import json
+import random
+import argparse
+
+
+def random_bytes(rng, size):
+    # incompressible like real detector frames, but reproducible
+    return ('%0*x' % (size * 2, rng.getrandbits(size * 8))).decode('hex') if size else ''
+
+
+def write_tree(path, rng, depth, fanout, files, size):
+    for i in range(files):
+        with open(os.path.join(path, 'file-{:04}.raw'.format(i)), 'wb') as f:
+            f.write(random_bytes(rng, size))
+
+    if depth > 0:
+        for i in range(fanout):
+            subdir = os.path.join(path, 'dir-{:02}'.format(i))
+            os.makedirs(subdir)
+            write_tree(subdir, rng, depth - 1, fanout, files, size)
+
+
+def generate(users=10, datasets=20, depth=2, fanout=3, files=10, size=1024,
+             reviews=3, bookmarks=3, private=0.2, grants=2, seed=0):
+    """Create users, datasets with directory trees, reviews, bookmarks and
+    permissions and return a summary of what was created."""
+    from nova import db, logic, models
+
+    rng = random.Random(seed)
+
+    created_users = [models.User(name='user{}'.format(i), fullname='User {}'.format(i),
+                                 email='user{}@localhost'.format(i), password='bench',
+                                 is_admin=i == 0)
+                     for i in range(users)]
+    db.session.add_all(created_users)
+    db.session.commit()
+
+    for user in created_users:
+        user.generate_token()
+
+    collection = logic.create_collection('bench', created_users[0], 'Synthetic datasets')
+    created_datasets = []
+
+    for i in range(datasets):
+        owner = created_users[i % users]
+        dataset = logic.create_dataset(models.Dataset, 'dataset{}'.format(i), owner, collection,
+                                       description='Synthetic dataset {}'.format(i))
+        write_tree(dataset.path, rng, depth, fanout, files, size)
+        created_datasets.append(dataset)
+
+    for dataset in created_datasets:
+        owner = dataset.permissions.owner
+        others = [u for u in created_users if u != owner]
+
+        if rng.random() < private:
+            dataset.permissions.can_read = False
+            dataset.permissions.can_interact = False
+
+            for user in rng.sample(others, min(grants, len(others))):
+                db.session.add(models.DirectAccess(user=user, dataset=dataset, can_read=True))
+
+        for user in rng.sample(others, min(reviews, len(others))):
+            rating = rng.randint(1, 5)
+            db.session.add(models.Review(user, dataset, rating, 'Review by {}'.format(user.name)))
+            dataset.review_count += 1
+            dataset.rating_sum += rating
+
+        for user in rng.sample(others, min(bookmarks, len(others))):
+            db.session.add(models.Bookmark(user, dataset))
+
+    db.session.commit()
+
+    files_per_dataset = sum(files * fanout ** level for level in range(depth + 1))
+
+    return dict(users=users, datasets=datasets, files_per_dataset=files_per_dataset,
+                file_size=size, bytes_per_dataset=files_per_dataset * size,
+                reviews=reviews * datasets, bookmarks=bookmarks * datasets)
+
+
+def add_arguments(parser):
+    parser.add_argument('--users', type=int, default=10, help="Number of users")
+    parser.add_argument('--datasets', type=int, default=20, help="Number of datasets")
+    parser.add_argument('--depth', type=int, default=2, help="Directory depth per dataset")
+    parser.add_argument('--fanout', type=int, default=3, help="Subdirectories per directory")
+    parser.add_argument('--files', type=int, default=10, help="Files per directory")
+    parser.add_argument('--size', type=int, default=1024, help="Bytes per file")
+    parser.add_argument('--reviews', type=int, default=3, help="Reviews per dataset")
+    parser.add_argument('--bookmarks', type=int, default=3, help="Bookmarks per dataset")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+
+
+def generate_from(args):
+    return generate(users=args.users, datasets=args.datasets, depth=args.depth,
+                    fanout=args.fanout, files=args.files, size=args.size,
+                    reviews=args.reviews, bookmarks=args.bookmarks, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    from nova import db
+    db.create_all()
+    print json.dumps(generate_from(args))
+
+
+if __name__ == '__main__':
+    main()
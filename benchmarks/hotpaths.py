@@ -0,0 +1,158 @@
+"""Measure nova's hot paths on a synthetic instance.
+
+A fresh instance is generated in a temporary directory (see generate.py) and
+each path is timed several times. Elasticsearch is replaced by an in-memory
+fake so that search and reindexing measure nova and not the search server.
+Results are printed as JSON, compare them between versions with e.g.
+
+    $ python benchmarks/hotpaths.py --output before.json
+    $ git checkout other-branch
+    $ python benchmarks/hotpaths.py --output after.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import generate
+
+
+class FakeIndices(object):
+    def __init__(self, es):
+        self.es = es
+
+    def create(self, index, **kwargs):
+        self.es.documents.setdefault(index, [])
+
+    def delete(self, index, **kwargs):
+        self.es.documents.pop(index, None)
+
+
+class FakeElasticsearch(object):
+    # matches each query term against the tokenized name, enough to drive
+    # the search views
+    def __init__(self):
+        self.documents = {}
+        self.indices = FakeIndices(self)
+
+    def ping(self):
+        return True
+
+    def create(self, index, doc_type, body):
+        self.documents.setdefault(index, []).append(body)
+
+    def bulk(self, body):
+        for action, document in zip(body[::2], body[1::2]):
+            self.create(action['index']['_index'], action['index']['_type'], document)
+
+    def search(self, index, doc_type, body):
+        terms = body['query']['match']['tokenized']['query'].lower().split()
+        hits = [dict(_source=doc) for doc in self.documents.get(index, [])
+                if all(term in doc['tokenized'] for term in terms)]
+        return dict(hits=dict(total=len(hits), hits=hits[:body.get('size', 10)]))
+
+
+def measure(func, repeat):
+    times = []
+
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+
+    times.sort()
+    return dict(median=times[len(times) // 2], min=times[0], max=times[-1], runs=repeat)
+
+
+def check(response, status=200):
+    if response.status_code != status:
+        raise RuntimeError("{} returned {}".format(response, response.status_code))
+
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    generate.add_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement")
+    parser.add_argument('--output', help="Write results to this file instead of stdout")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    config = os.path.join(root, 'nova.cfg')
+
+    with open(config, 'w') as f:
+        f.write("NOVA_ROOT_PATH = {!r}\n".format(root))
+        f.write("DEBUG = True\n")
+        f.write("WTF_CSRF_ENABLED = False\n")
+        f.write("CACHE_TYPE = 'null'\n")
+        f.write("NOVA_PASSWORD_OPTIONS = {'pbkdf2_sha512__default_rounds': 1000, "
+                "'pbkdf2_sha512__min_rounds': 1000}\n")
+
+    os.environ['NOVA_SETTINGS'] = config
+
+    import nova
+    from nova import app, db, fs, utils, models
+
+    nova._es = FakeElasticsearch()
+    nova.create_app()
+    db.create_all()
+
+    summary = generate.generate_from(args)
+
+    admin = models.User.query.filter(models.User.name == 'user0').first()
+    dataset = models.Dataset.query.filter(models.Dataset.name == 'dataset0').first()
+    datasets = models.Dataset.query.all()
+    owner, name, token = admin.name, dataset.name, admin.token
+    db.session.remove()
+
+    client = app.test_client()
+    check(client.post('/login', data={'name': owner, 'password': 'bench'}), 302)
+    headers = {'Auth-Token': token}
+    results = {}
+
+    def download():
+        return check(client.get('/api/datasets/{}/{}/data'.format(owner, name), headers=headers))
+
+    archive_size = len(download().data)
+    results['data_get'] = measure(download, args.repeat)
+    results['data_get']['bytes'] = archive_size
+    results['data_get']['bytes_per_second'] = summary['bytes_per_dataset'] / results['data_get']['median']
+
+    results['show_dataset'] = measure(
+        lambda: check(client.get('/dataset/{}/{}'.format(owner, name))), args.repeat)
+
+    results['get_statistics'] = measure(lambda: fs.get_statistics(datasets), args.repeat)
+
+    def copy():
+        destination = tempfile.mkdtemp(dir=root)
+        utils.copy(dataset.path, destination)
+        shutil.rmtree(destination)
+
+    results['utils_copy'] = measure(copy, args.repeat)
+
+    results['reindex'] = measure(lambda: check(client.get('/reindex'), 302), args.repeat)
+
+    results['complete_search'] = measure(
+        lambda: check(client.get('/search?q=dataset1')), args.repeat)
+
+    results['api_request'] = measure(
+        lambda: check(client.get('/api/notifications', headers=headers)), args.repeat * 10)
+
+    output = json.dumps(dict(benchmark='hotpaths', python=sys.version.split()[0],
+                             parameters=vars(args), data=summary, seconds=results),
+                        indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print output
+
+    shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compare registering datasets one by one with the bulk endpoint.
+
+    $ python benchmarks/ingest.py --datasets 1000
+"""
+import os
+import json
+import time
+import tempfile
+import argparse
+from hotpaths import FakeElasticsearch
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--datasets', type=int, default=500, help="Datasets to register per run")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    config = os.path.join(root, 'nova.cfg')
+
+    with open(config, 'w') as f:
+        f.write("NOVA_ROOT_PATH = {!r}\nDEBUG = True\n".format(root))
+
+    os.environ['NOVA_SETTINGS'] = config
+
+    import nova
+    from nova import app, db, logic, models
+
+    nova._es = FakeElasticsearch()
+    nova.create_app()
+    db.create_all()
+
+    user = models.User(name='bench', fullname='Bench', email='bench@localhost', password='bench')
+    db.session.add(user)
+    db.session.commit()
+    user.generate_token()
+    logic.create_collection('single', user)
+    logic.create_collection('bulk', user)
+    headers = {'Auth-Token': user.token}
+    db.session.remove()
+
+    client = app.test_client()
+    start = time.time()
+
+    for i in range(args.datasets):
+        response = client.post('/api/datasets', headers=headers,
+                               data=dict(name='single{}'.format(i), collection='single'))
+        assert response.status_code == 201
+
+    single = time.time() - start
+
+    specs = [dict(name='bulk{}'.format(i), collection='bulk') for i in range(args.datasets)]
+    start = time.time()
+    response = client.post('/api/datasets/bulk', headers=dict(headers, **{'Content-Type': 'application/json'}),
+                           data=json.dumps(specs))
+    assert response.status_code == 201
+    bulk = time.time() - start
+
+    print json.dumps(dict(benchmark='ingest', datasets=args.datasets,
+                          single=dict(seconds=single, datasets_per_second=args.datasets / single),
+                          bulk=dict(seconds=bulk, datasets_per_second=args.datasets / bulk),
+                          speedup=single / bulk))
+
+
+if __name__ == '__main__':
+    main()
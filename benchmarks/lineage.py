@@ -0,0 +1,86 @@
+"""Check the lineage endpoint at the ends of the process graph.
+
+A fresh instance gets a chain of derived datasets first -> middle -> last
+and a dataset without any processes. The lineage of each is requested in
+every direction and compared with the expected edges, the script exits with
+an error on any mismatch:
+
+    $ python benchmarks/lineage.py
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+
+def main():
+    root = tempfile.mkdtemp()
+    config = os.path.join(root, 'nova.cfg')
+
+    with open(config, 'w') as f:
+        f.write("NOVA_ROOT_PATH = {!r}\n".format(root))
+        f.write("CACHE_TYPE = 'null'\n")
+        f.write("NOVA_PASSWORD_OPTIONS = {'pbkdf2_sha512__default_rounds': 1000, "
+                "'pbkdf2_sha512__min_rounds': 1000}\n")
+
+    os.environ['NOVA_SETTINGS'] = config
+
+    import nova
+    from nova import app, db, logic, models
+
+    nova.create_app()
+    db.create_all()
+
+    user = models.User(name='user', fullname='User', email='user@localhost',
+                       password='check', is_admin=True)
+    db.session.add(user)
+    db.session.commit()
+    user.generate_token()
+
+    collection = logic.create_collection('check', user, 'Lineage check')
+    first = logic.create_dataset(models.Dataset, 'first', user, collection)
+    middle = logic.derive_dataset(models.Dataset, first, user, 'middle')
+    logic.derive_dataset(models.Dataset, middle, user, 'last')
+    logic.create_dataset(models.Dataset, 'alone', user, collection)
+    token = user.token
+    db.session.remove()
+
+    chain = [('first', 'middle'), ('middle', 'last')]
+
+    expected = {
+        'first': dict(ancestors=[], descendants=chain, both=chain),
+        'middle': dict(ancestors=chain[:1], descendants=chain[1:], both=chain),
+        'last': dict(ancestors=chain, descendants=[], both=chain),
+        'alone': dict(ancestors=[], descendants=[], both=[]),
+    }
+
+    client = app.test_client()
+    failed = []
+
+    for name, directions in sorted(expected.items()):
+        for direction, edges in sorted(directions.items()):
+            response = client.get('/api/datasets/user/{}/lineage?direction={}'.format(name, direction),
+                                  headers={'Auth-Token': token})
+
+            if response.status_code != 200:
+                failed.append('{} {}: status {}'.format(name, direction, response.status_code))
+                continue
+
+            data = json.loads(response.data)
+            names = dict((node['id'], node['name']) for node in data['nodes'])
+            found = sorted((names[e['source']], names[e['destination']]) for e in data['edges'])
+
+            if found != sorted(edges):
+                failed.append('{} {}: edges {}'.format(name, direction, found))
+
+            print '{:<8} {:<12} {}'.format(name, direction, 'ok' if found == sorted(edges) else 'FAILED')
+
+    shutil.rmtree(root)
+
+    if failed:
+        sys.exit("Unexpected lineage for {}".format('; '.join(failed)))
+
+
+if __name__ == '__main__':
+    main()
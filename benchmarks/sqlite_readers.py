@@ -0,0 +1,90 @@
+"""Measure read throughput while another thread keeps writing.
+
+Run once with routing and once without to compare:
+
+    $ python benchmarks/sqlite_readers.py --readers 4
+    $ python benchmarks/sqlite_readers.py --readers 0
+"""
+import os
+import json
+import time
+import tempfile
+import argparse
+import threading
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readers', type=int, default=4, help="Read connections, 0 disables routing")
+    parser.add_argument('--threads', type=int, default=8, help="Concurrent reading threads")
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds to run")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    config = os.path.join(root, 'nova.cfg')
+
+    with open(config, 'w') as f:
+        f.write("NOVA_ROOT_PATH = {!r}\nDEBUG = True\nNOVA_SQLITE_READERS = {}\n".format(root, args.readers))
+
+    os.environ['NOVA_SETTINGS'] = config
+
+    from nova import db
+    from nova.models import User, Notification
+
+    db.create_all()
+    user = User(name='bench', fullname='Bench', email='bench@localhost', password='bench')
+    db.session.add(user)
+    db.session.commit()
+    uid = user.id
+    db.session.remove()
+
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0}
+    lock = threading.Lock()
+
+    def write():
+        n = 0
+
+        while not stop.is_set():
+            db.session.add(Notification(User.query.get(uid), message='bench'))
+            db.session.commit()
+            n += 1
+
+        db.session.remove()
+
+        with lock:
+            counts['writes'] += n
+
+    def read():
+        n = 0
+
+        while not stop.is_set():
+            Notification.query.filter(Notification.user_id == uid).order_by(Notification.id.desc()).limit(20).all()
+            db.session.commit()
+            n += 1
+
+        db.session.remove()
+
+        with lock:
+            counts['reads'] += n
+
+    threads = [threading.Thread(target=write)]
+    threads += [threading.Thread(target=read) for _ in range(args.threads)]
+
+    for thread in threads:
+        thread.start()
+
+    time.sleep(args.duration)
+    stop.set()
+
+    for thread in threads:
+        thread.join()
+
+    print json.dumps(dict(benchmark='sqlite_readers', readers=args.readers, threads=args.threads,
+                          duration=args.duration,
+                          reads_per_second=counts['reads'] / args.duration,
+                          writes_per_second=counts['writes'] / args.duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Measure how long it takes to import nova in a fresh interpreter.
+
+Each scenario runs in its own process so nothing is shared between runs:
+
+    $ python benchmarks/startup.py --runs 10
+"""
+import os
+import sys
+import json
+import tempfile
+import argparse
+import subprocess
+
+
+SCENARIOS = [
+    ('core', 'import nova'),
+    ('worker', 'import nova.tasks'),
+    ('web', 'import nova; nova.create_app()'),
+]
+
+TIMER = """
+import time
+start = time.time()
+{}
+print(time.time() - start)
+"""
+
+
+def measure(statement, runs, env):
+    times = []
+
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', TIMER.format(statement)], env=env,
+                                         stderr=open(os.devnull, 'w'))
+        times.append(float(output.split()[-1]))
+
+    times.sort()
+    return dict(median=times[len(times) // 2], min=times[0], max=times[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10, help="Runs per scenario")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    config = os.path.join(root, 'nova.cfg')
+
+    # no DEBUG, so that blocking on Elasticsearch at startup would show up
+    with open(config, 'w') as f:
+        f.write("NOVA_ROOT_PATH = {!r}\n".format(root))
+
+    env = dict(os.environ, NOVA_SETTINGS=config)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.getcwd(), env.get('PYTHONPATH')]))
+
+    results = {name: measure(statement, args.runs, env) for name, statement in SCENARIOS}
+    print json.dumps(dict(benchmark='startup', runs=args.runs, seconds=results))
+
+
+if __name__ == '__main__':
+    main()
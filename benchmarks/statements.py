@@ -0,0 +1,114 @@
+"""Check that listings issue the same number of SQL statements however many
+rows they show.
+
+Each endpoint is requested on a small and on a larger synthetic instance (see
+generate.py), every instance in a process of its own. The statement counts
+are printed and the script exits with an error if any of them grew, e.g.
+because a relationship is loaded lazily per row again:
+
+    $ python benchmarks/statements.py
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+import subprocess
+import generate
+
+
+ENDPOINTS = [
+    ('UserBookmarks', '/api/user/user0/bookmarks', True),
+    ('Reviews', '/api/datasets/user0/dataset0/reviews', True),
+    ('list_bookmarks', '/user/user0/bookmarks', False),
+    ('show_collection', '/collection/bench', False),
+]
+
+SCALES = [(3, 3), (8, 12)]
+
+
+def count(users, datasets):
+    """Return the statements issued per endpoint on an instance with users
+    users and datasets datasets, all of them reviewed and bookmarked by every
+    user but their owner."""
+    root = tempfile.mkdtemp()
+    config = os.path.join(root, 'nova.cfg')
+
+    with open(config, 'w') as f:
+        f.write("NOVA_ROOT_PATH = {!r}\n".format(root))
+        f.write("WTF_CSRF_ENABLED = False\n")
+        f.write("CACHE_TYPE = 'null'\n")
+        f.write("NOVA_PASSWORD_OPTIONS = {'pbkdf2_sha512__default_rounds': 1000, "
+                "'pbkdf2_sha512__min_rounds': 1000}\n")
+
+    os.environ['NOVA_SETTINGS'] = config
+
+    import nova
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from nova import app, db, models
+
+    nova.create_app()
+    db.create_all()
+    generate.generate(users=users, datasets=datasets, depth=0, files=0,
+                      reviews=users, bookmarks=users, private=0)
+
+    token = models.User.query.filter(models.User.name == 'user0').one().token
+    db.session.remove()
+
+    statements = []
+    # every engine, reads may go to separate SQLite connections
+    event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    client = app.test_client()
+    client.post('/login', data={'name': 'user0', 'password': 'bench'})
+    counts = {}
+
+    for name, url, api in ENDPOINTS:
+        headers = {'Auth-Token': token} if api else {}
+
+        # the first request also verifies the token or loads the session user
+        client.get(url, headers=headers)
+        del statements[:]
+        response = client.get(url, headers=headers)
+
+        if response.status_code != 200:
+            raise RuntimeError("{} returned {}".format(url, response.status_code))
+
+        counts[name] = len(statements)
+
+    shutil.rmtree(root)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scale:
+        print json.dumps(count(*args.scale))
+        return
+
+    # a fresh interpreter per instance, nova binds its settings on import
+    results = [json.loads(subprocess.check_output([sys.executable, __file__, '--scale',
+                                                   str(users), str(datasets)]))
+               for users, datasets in SCALES]
+    grown = []
+
+    print '{:<20} {}'.format('endpoint', ' '.join('{:>10}'.format('{}x{}'.format(*s)) for s in SCALES))
+
+    for name, _, _ in ENDPOINTS:
+        counts = [result[name] for result in results]
+        print '{:<20} {}'.format(name, ' '.join('{:>10}'.format(n) for n in counts))
+
+        if len(set(counts)) > 1:
+            grown.append(name)
+
+    if grown:
+        sys.exit("Statements grow with the number of rows in {}".format(', '.join(grown)))
+
+
+if __name__ == '__main__':
+    main()
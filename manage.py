@@ -1,9 +1,9 @@
 import sys
 import getpass
-from nova import app, db
+from nova import app, db, create_app
 from nova.models import User
-from flask_script import Manager, Command, Option
-from flask_migrate import MigrateCommand
+from flask_script import Manager, Command, Option, Server
+from flask_migrate import Migrate, MigrateCommand
 
 
 class InitDatabaseCommand(Command):
@@ -28,9 +28,134 @@ class InitDatabaseCommand(Command):
         admin.generate_token()
 
 
+class RebuildPermissionsCommand(Command):
+
+    def run(self):
+        from nova import access
+
+        with db.engine.begin() as connection:
+            access.rebuild_all(connection)
+
+
+class ExplainCommand(Command):
+
+    def run(self):
+        from sqlalchemy import or_
+        from nova import access
+        from nova.models import (Dataset, Permission, Process, Bookmark,
+            Notification, AccessRequest, EffectivePermission)
+
+        if db.engine.name != 'sqlite':
+            sys.exit("Query plans can only be checked on SQLite.")
+
+        user = User.query.first()
+
+        if user is None:
+            sys.exit("No users found, run initdb first.")
+
+        owned = Dataset.query.join(Permission).filter(Permission.owner_id == user.id)
+
+        # these mirror the queries issued by the corresponding views and resources
+        queries = [
+            ('show_dataset', User.query.filter(User.name == 'name')),
+            ('show_dataset', Dataset.query.join(Permission).
+                filter(Dataset.name == 'name').filter(Permission.owner_id == user.id)),
+            ('show_dataset', db.session.query(EffectivePermission.can_read).
+                filter(EffectivePermission.dataset_id == 1).
+                filter(or_(EffectivePermission.user_id == user.id,
+                           EffectivePermission.user_id == None))),
+            ('show_dataset', db.session.query(Dataset).join(Process.source).
+                filter(Process.destination_id == 1)),
+            ('show_dataset', db.session.query(Dataset).join(Process.destination).
+                filter(Process.source_id == 1)),
+            ('profile', Bookmark.query.filter(Bookmark.user_id == user.id)),
+            ('profile', access.readable(owned, user)),
+            ('index', owned.order_by(Dataset.created.desc()).limit(5).distinct()),
+            ('index', AccessRequest.query.join(Dataset).join(Permission).
+                filter(Permission.owner_id == user.id)),
+            ('Notifications.get', Notification.query.filter(Notification.user_id == user.id)),
+            ('Bookmarks.get', Bookmark.query.join(Dataset).join(Permission).join(User).
+                filter(Dataset.name == 'name').filter(User.name == 'name').
+                filter(Bookmark.user_id == user.id)),
+        ]
+
+        scans = 0
+
+        for name, query in queries:
+            compiled = query.statement.compile(db.engine)
+            params = [compiled.params[key] for key in compiled.positiontup]
+
+            for row in db.engine.execute('EXPLAIN QUERY PLAN ' + str(compiled), params):
+                detail = row[-1]
+                scan = detail.startswith('SCAN') and not 'USING' in detail and \
+                    not 'SUBQUERY' in detail
+                scans += 1 if scan else 0
+                print '{:<20} {}{}'.format(name, detail, ' <- full table scan' if scan else '')
+
+        if scans:
+            sys.exit("{} full table scans in hot queries".format(scans))
+
+
+class WatchCommand(Command):
+
+    option_list = (
+        Option('--poll', dest='poll', action='store_true', help="Poll instead of using inotify"),
+    )
+
+    def run(self, poll):
+        from nova.watcher import Watcher
+
+        Watcher(app.config['NOVA_ROOT_PATH'], polling=poll).run()
+
+
+class GarbageCommand(Command):
+
+    option_list = (
+        Option('--sweep', dest='sweep', action='store_true', help="Report directories that belong to no dataset"),
+        Option('--bury', dest='bury', action='store_true', help="Tombstone the reported directories"),
+    )
+
+    def run(self, sweep, bury):
+        from nova import garbage
+
+        if not sweep:
+            garbage.collect()
+            return
+
+        orphans = garbage.sweep()
+
+        for path, files, size in orphans:
+            print '{:>12} {:>8} {}'.format(size, files, path)
+
+        if orphans and bury:
+            garbage.bury(path for path, _, _ in orphans)
+
+
+class RecountUsageCommand(Command):
+
+    def run(self):
+        from nova import quota
+
+        quota.recount()
+
+
+class RunServerCommand(Server):
+
+    def __call__(self, app, *args, **kwargs):
+        return super(RunServerCommand, self).__call__(create_app(), *args, **kwargs)
+
+
+migrate = Migrate(app, db)
+
 manager = Manager(app)
+manager.add_command('runserver', RunServerCommand)
 manager.add_command('initdb', InitDatabaseCommand)
 manager.add_command('db', MigrateCommand)
+manager.add_command('rebuild-permissions', RebuildPermissionsCommand)
+manager.add_command('explain', ExplainCommand)
+manager.add_command('watch', WatchCommand)
+manager.add_command('gc', GarbageCommand)
+manager.add_command('recount-usage', RecountUsageCommand)
 
 
 if __name__ == '__main__':
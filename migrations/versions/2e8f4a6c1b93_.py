@@ -0,0 +1,26 @@
+"""empty message
+
+Revision ID: 2e8f4a6c1b93
+Revises: 9b1e5c3a7d24
+Create Date: 2026-10-19 16:05:51.918342
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2e8f4a6c1b93'
+down_revision = '9b1e5c3a7d24'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    with op.batch_alter_table('datasets', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('file_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('size', sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('datasets', schema=None) as batch_op:
+        batch_op.drop_column('size')
+        batch_op.drop_column('file_count')
@@ -0,0 +1,26 @@
+"""empty message
+
+Revision ID: 3f7a1d9c4e62
+Revises: 6c0e9d4b2a57
+Create Date: 2026-10-19 21:12:40.518263
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3f7a1d9c4e62'
+down_revision = '6c0e9d4b2a57'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    with op.batch_alter_table('tombstones', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('checks', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('retry', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('tombstones', schema=None) as batch_op:
+        batch_op.drop_column('retry')
+        batch_op.drop_column('checks')
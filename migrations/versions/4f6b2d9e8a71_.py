@@ -0,0 +1,24 @@
+"""empty message
+
+Revision ID: 4f6b2d9e8a71
+Revises: c3d8a6f1e09b
+Create Date: 2026-10-19 14:03:48.510226
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4f6b2d9e8a71'
+down_revision = 'c3d8a6f1e09b'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    with op.batch_alter_table('datasets', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('datasets', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,26 @@
+"""empty message
+
+Revision ID: 6c0e9d4b2a57
+Revises: a94f2c7e1d36
+Create Date: 2026-10-19 19:48:22.103617
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '6c0e9d4b2a57'
+down_revision = 'a94f2c7e1d36'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    with op.batch_alter_table('datasets', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('verified', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('damaged', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('datasets', schema=None) as batch_op:
+        batch_op.drop_column('damaged')
+        batch_op.drop_column('verified')
@@ -0,0 +1,50 @@
+"""empty message
+
+Revision ID: 7a3f9e2b5c18
+Revises: e5a1d07c6b42
+Create Date: 2026-10-19 11:48:52.130947
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7a3f9e2b5c18'
+down_revision = 'e5a1d07c6b42'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_index('ix_access_requests_dataset_id', 'access_requests', ['dataset_id'])
+    op.create_index('ix_bookmarks_user_id_dataset_id', 'bookmarks', ['user_id', 'dataset_id'])
+    op.create_index('ix_bookmarks_dataset_id', 'bookmarks', ['dataset_id'])
+    op.create_index('ix_connections_from_id_to_id', 'connections', ['from_id', 'to_id'])
+    op.create_index('ix_connections_to_id', 'connections', ['to_id'])
+    op.create_index('ix_datasets_name', 'datasets', ['name'])
+    op.create_index('ix_datasets_collection_id', 'datasets', ['collection_id'])
+    op.create_index('ix_direct_access_dataset_id_user_id', 'direct_access', ['dataset_id', 'user_id'])
+    op.create_index('ix_memberships_group_id', 'memberships', ['group_id'])
+    op.create_index('ix_notifications_user_id', 'notifications', ['user_id'])
+    op.create_index('ix_permissions_dataset_id', 'permissions', ['dataset_id'])
+    op.create_index('ix_permissions_owner_id_dataset_id', 'permissions', ['owner_id', 'dataset_id'])
+    op.create_index('ix_processes_source_id', 'processes', ['source_id'])
+    op.create_index('ix_processes_destination_id', 'processes', ['destination_id'])
+    op.create_index('ix_reviews_dataset_id_user_id', 'reviews', ['dataset_id', 'user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_reviews_dataset_id_user_id', table_name='reviews')
+    op.drop_index('ix_processes_destination_id', table_name='processes')
+    op.drop_index('ix_processes_source_id', table_name='processes')
+    op.drop_index('ix_permissions_owner_id_dataset_id', table_name='permissions')
+    op.drop_index('ix_permissions_dataset_id', table_name='permissions')
+    op.drop_index('ix_notifications_user_id', table_name='notifications')
+    op.drop_index('ix_memberships_group_id', table_name='memberships')
+    op.drop_index('ix_direct_access_dataset_id_user_id', table_name='direct_access')
+    op.drop_index('ix_datasets_collection_id', table_name='datasets')
+    op.drop_index('ix_datasets_name', table_name='datasets')
+    op.drop_index('ix_connections_to_id', table_name='connections')
+    op.drop_index('ix_connections_from_id_to_id', table_name='connections')
+    op.drop_index('ix_bookmarks_dataset_id', table_name='bookmarks')
+    op.drop_index('ix_bookmarks_user_id_dataset_id', table_name='bookmarks')
+    op.drop_index('ix_access_requests_dataset_id', table_name='access_requests')
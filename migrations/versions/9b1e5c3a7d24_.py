@@ -0,0 +1,54 @@
+"""empty message
+
+Revision ID: 9b1e5c3a7d24
+Revises: 4f6b2d9e8a71
+Create Date: 2026-10-19 15:12:37.204118
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9b1e5c3a7d24'
+down_revision = '4f6b2d9e8a71'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+LOOKUPS = [('genuses', 'genus_id'), ('families', 'family_id'), ('orders', 'order_id')]
+
+
+def upgrade():
+    # merge duplicate names into the row with the lowest id before making
+    # them unique
+    for table, column in LOOKUPS:
+        op.execute('UPDATE samplescans SET {column} = '
+                   '(SELECT MIN(b.id) FROM {table} a JOIN {table} b ON a.name = b.name '
+                   'WHERE a.id = samplescans.{column}) '
+                   'WHERE {column} IS NOT NULL'.format(table=table, column=column))
+        op.execute('DELETE FROM {table} WHERE id NOT IN '
+                   '(SELECT MIN(id) FROM {table} GROUP BY name)'.format(table=table))
+        op.create_index('ix_{}_name'.format(table), table, ['name'], unique=True)
+
+    op.create_table('taxonomy_imports',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('filename', sa.String(), nullable=True),
+    sa.Column('path', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('position', sa.Integer(), nullable=True),
+    sa.Column('rows', sa.Integer(), nullable=True),
+    sa.Column('updated', sa.Integer(), nullable=True),
+    sa.Column('errors', sa.Text(), nullable=True),
+    sa.Column('created', sa.DateTime(), nullable=True),
+    sa.Column('finished', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('taxonomy_imports')
+
+    for table, _ in LOOKUPS:
+        op.drop_index('ix_{}_name'.format(table), table_name=table)
@@ -0,0 +1,34 @@
+"""empty message
+
+Revision ID: a94f2c7e1d36
+Revises: d71c3b8e5f20
+Create Date: 2026-10-19 18:31:07.552184
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a94f2c7e1d36'
+down_revision = 'd71c3b8e5f20'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('usage', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('quota', sa.BigInteger(), nullable=True))
+
+    with op.batch_alter_table('collections', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('usage', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('quota', sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('collections', schema=None) as batch_op:
+        batch_op.drop_column('quota')
+        batch_op.drop_column('usage')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('quota')
+        batch_op.drop_column('usage')
@@ -0,0 +1,32 @@
+"""empty message
+
+Revision ID: b2e7c4a91f3d
+Revises: 5319c9f4b7bc
+Create Date: 2026-10-19 10:12:41.218734
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b2e7c4a91f3d'
+down_revision = '5319c9f4b7bc'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    with op.batch_alter_table('datasets', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('review_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('rating_sum', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute("""
+        UPDATE datasets SET
+            review_count = (SELECT COUNT(*) FROM reviews WHERE reviews.dataset_id = datasets.id),
+            rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM reviews WHERE reviews.dataset_id = datasets.id)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('datasets', schema=None) as batch_op:
+        batch_op.drop_column('rating_sum')
+        batch_op.drop_column('review_count')
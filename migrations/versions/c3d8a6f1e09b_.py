@@ -0,0 +1,31 @@
+"""empty message
+
+Revision ID: c3d8a6f1e09b
+Revises: 7a3f9e2b5c18
+Create Date: 2026-10-19 13:21:05.772410
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c3d8a6f1e09b'
+down_revision = '7a3f9e2b5c18'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('services',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('url', sa.String(), nullable=True),
+    sa.Column('secret', sa.String(), nullable=True),
+    sa.Column('registered', sa.DateTime(), nullable=True),
+    sa.Column('last_seen', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('services')
@@ -0,0 +1,36 @@
+"""empty message
+
+Revision ID: d71c3b8e5f20
+Revises: 2e8f4a6c1b93
+Create Date: 2026-10-19 17:12:40.271903
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd71c3b8e5f20'
+down_revision = '2e8f4a6c1b93'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('dataset_id', sa.Integer(), nullable=True),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('path', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('files', sa.Integer(), nullable=True),
+    sa.Column('size', sa.BigInteger(), nullable=True),
+    sa.Column('created', sa.DateTime(), nullable=True),
+    sa.Column('started', sa.DateTime(), nullable=True),
+    sa.Column('reclaimed', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tombstones_status', 'tombstones', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_tombstones_status', table_name='tombstones')
+    op.drop_table('tombstones')
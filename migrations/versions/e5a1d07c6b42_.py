@@ -0,0 +1,73 @@
+"""empty message
+
+Revision ID: e5a1d07c6b42
+Revises: b2e7c4a91f3d
+Create Date: 2026-10-19 11:02:17.604311
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e5a1d07c6b42'
+down_revision = 'b2e7c4a91f3d'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('effective_permissions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('dataset_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('can_read', sa.Boolean(), nullable=True),
+    sa.Column('can_interact', sa.Boolean(), nullable=True),
+    sa.Column('can_fork', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['dataset_id'], ['datasets.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_effective_permissions_dataset_id_user_id', 'effective_permissions', ['dataset_id', 'user_id'])
+    op.create_index('ix_effective_permissions_user_id_dataset_id', 'effective_permissions', ['user_id', 'dataset_id'])
+
+    # Backfill with one row per grant. Rows for the same user and dataset are
+    # merged once the dataset's permissions change again.
+    effective = sa.table('effective_permissions',
+        sa.column('dataset_id'), sa.column('user_id'),
+        sa.column('can_read'), sa.column('can_interact'), sa.column('can_fork'))
+    permissions = sa.table('permissions',
+        sa.column('dataset_id'), sa.column('owner_id'),
+        sa.column('can_read'), sa.column('can_interact'), sa.column('can_fork'))
+    direct = sa.table('direct_access',
+        sa.column('dataset_id'), sa.column('user_id'), sa.column('group_id'),
+        sa.column('can_read'), sa.column('can_interact'), sa.column('can_fork'))
+    memberships = sa.table('memberships', sa.column('user_id'), sa.column('group_id'))
+    columns = ['dataset_id', 'user_id', 'can_read', 'can_interact', 'can_fork']
+
+    op.execute(effective.insert().from_select(columns,
+        sa.select([permissions.c.dataset_id, sa.null(), permissions.c.can_read,
+                   permissions.c.can_interact, permissions.c.can_fork]).
+        where(permissions.c.dataset_id != None)))
+
+    op.execute(effective.insert().from_select(columns,
+        sa.select([permissions.c.dataset_id, permissions.c.owner_id,
+                   sa.true(), sa.true(), sa.true()]).
+        where(permissions.c.dataset_id != None).
+        where(permissions.c.owner_id != None)))
+
+    op.execute(effective.insert().from_select(columns,
+        sa.select([direct.c.dataset_id, direct.c.user_id, direct.c.can_read,
+                   direct.c.can_interact, direct.c.can_fork]).
+        where(direct.c.dataset_id != None).
+        where(direct.c.user_id != None)))
+
+    op.execute(effective.insert().from_select(columns,
+        sa.select([direct.c.dataset_id, memberships.c.user_id, direct.c.can_read,
+                   direct.c.can_interact, direct.c.can_fork]).
+        select_from(direct.join(memberships, memberships.c.group_id == direct.c.group_id)).
+        where(direct.c.dataset_id != None)))
+
+
+def downgrade():
+    op.drop_index('ix_effective_permissions_user_id_dataset_id', table_name='effective_permissions')
+    op.drop_index('ix_effective_permissions_dataset_id_user_id', table_name='effective_permissions')
+    op.drop_table('effective_permissions')
@@ -1,15 +1,13 @@
 import os
+import threading
 import jinja2
 from flask import Flask
 from flask_login import LoginManager, current_user
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_admin import Admin
-from flask_admin.contrib.sqla import ModelView
-from flask_restful import Api
+from flask_cache import Cache
+from werkzeug.local import LocalProxy
 from celery import Celery
-from elasticsearch import Elasticsearch
 from nova.fs import Filesystem
+from nova.database import RoutingSQLAlchemy, configure as configure_database
 
 __version__ = '0.1.0'
 
@@ -26,7 +24,8 @@ if not os.path.exists(os.path.abspath(app.config['NOVA_ROOT_PATH'])):
     os.makedirs(os.path.abspath(app.config['NOVA_ROOT_PATH']))
 
 app.config['NOVA_FS_LAYOUT'] = jinja2.Template('{{ root }}/{{ user }}/{{ dataset }}')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(app.config['NOVA_ROOT_PATH'], 'nova.db')
+
+configure_database(app)
 
 
 
@@ -36,71 +35,136 @@ def group(l, n):
         yield tuple(l[i:i+n])
 
 
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
+
+cache = Cache(app)
 
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
 fs = Filesystem(app)
 
-migrate = Migrate(app, db)
-
 celery = Celery(app.import_name, broker=app.config['CELERY_BROKER_URL'])
 
-es = Elasticsearch()
+_es = None
+_es_lock = threading.Lock()
+
+
+def get_elasticsearch():
+    global _es
+
+    # created on first use, Celery workers and most manage.py commands never
+    # talk to Elasticsearch
+    with _es_lock:
+        if _es is None:
+            from elasticsearch import Elasticsearch
+            from nova import metrics
+            _es = metrics.instrument_elasticsearch(Elasticsearch())
+
+    return _es
 
-if not app.config['DEBUG'] and not es.ping():
-    raise RuntimeError("Cannot connect to Elastisearch, please start or "
-                       "provide correct connection details")
+
+es = LocalProxy(get_elasticsearch)
 
 import nova.models
 
-class AdminModelView(ModelView):
-    def is_accessible(self):
-        return current_user.is_authenticated and current_user.is_admin
+# these register listeners that must also run in workers and commands
+import nova.access
+import nova.caching
+import nova.metrics
+
+api = None
+_api_lock = threading.Lock()
+
+
+def create_app():
+    """Register views, API resources and the admin interface on the app."""
+    with _api_lock:
+        return _create_app()
+
+
+def _create_app():
+    global api
+
+    if api is not None:
+        return app
 
-admin = Admin(app)
-admin.add_view(AdminModelView(nova.models.User, db.session))
-admin.add_view(AdminModelView(nova.models.Collection, db.session))
-admin.add_view(AdminModelView(nova.models.Dataset, db.session))
-admin.add_view(AdminModelView(nova.models.Permission, db.session))
-admin.add_view(AdminModelView(nova.models.Notification, db.session))
-admin.add_view(AdminModelView(nova.models.Review, db.session))
-admin.add_view(AdminModelView(nova.models.Bookmark, db.session))
-admin.add_view(AdminModelView(nova.models.AccessRequest, db.session))
-admin.add_view(AdminModelView(nova.models.DirectAccess, db.session))
+    from flask_admin import Admin
+    from flask_admin.contrib.sqla import ModelView
+    from flask_restful import Api
+    from nova import models, resources, search, metrics, profiler
 
+    class AdminModelView(ModelView):
+        def is_accessible(self):
+            return current_user.is_authenticated and current_user.is_admin
 
-from nova import resources
+    admin = Admin(app)
+    admin.add_view(AdminModelView(models.User, db.session))
+    admin.add_view(AdminModelView(models.Collection, db.session))
+    admin.add_view(AdminModelView(models.Dataset, db.session))
+    admin.add_view(AdminModelView(models.Permission, db.session))
+    admin.add_view(AdminModelView(models.Notification, db.session))
+    admin.add_view(AdminModelView(models.Review, db.session))
+    admin.add_view(AdminModelView(models.Bookmark, db.session))
+    admin.add_view(AdminModelView(models.AccessRequest, db.session))
+    admin.add_view(AdminModelView(models.DirectAccess, db.session))
 
-errors = {
-    'BadSignature': {
-        'message': "Token signature could not be verified",
-        'status': 409,
+    errors = {
+        'BadSignature': {
+            'message': "Token signature could not be verified",
+            'status': 409,
+        }
     }
-}
-
-api = Api(app, errors=errors)
-api.add_resource(resources.Groups, '/api/groups')
-api.add_resource(resources.Group, '/api/groups/<group_id>')
-api.add_resource(resources.Datasets, '/api/datasets')
-api.add_resource(resources.Dataset, '/api/datasets/<owner>/<dataset>')
-api.add_resource(resources.DeriveDataset, '/api/datasets/<owner>/<dataset>/derive')
-api.add_resource(resources.Data, '/api/datasets/<owner>/<dataset>/data')
-api.add_resource(resources.Bookmarks, '/api/datasets/<owner>/<dataset>/bookmarks')
-api.add_resource(resources.Reviews, '/api/datasets/<owner>/<dataset>/reviews')
-api.add_resource(resources.Permission, '/api/datasets/<owner>/<dataset>/permissions')
-api.add_resource(resources.AccessRequest, '/api/datasets/<owner>/<dataset>/request')
-api.add_resource(resources.DirectAccess, '/api/datasets/<owner>/<dataset>/request/<request_id>')
-api.add_resource(resources.Search, '/api/search')
-api.add_resource(resources.UserBookmarks, '/api/user/<username>/bookmarks')
-api.add_resource(resources.UserSearch, '/api/user/search')
-api.add_resource(resources.Notifications, '/api/notifications')
-api.add_resource(resources.Notification, '/api/notification/<notification_id>')
-api.add_resource(resources.Connections, '/api/user/<user_id>/connections')
-api.add_resource(resources.Connection, '/api/connection/<from_id>/<to_id>/<option>')
-api.add_resource(resources.Services, '/api/services')
-api.add_resource(resources.Service, '/api/service/<name>')
-
-import nova.views
 
+    rest_api = Api(app, errors=errors)
+    rest_api.add_resource(resources.Groups, '/api/groups')
+    rest_api.add_resource(resources.Group, '/api/groups/<group_id>')
+    rest_api.add_resource(resources.Datasets, '/api/datasets')
+    rest_api.add_resource(resources.BulkDatasets, '/api/datasets/bulk')
+    rest_api.add_resource(resources.Dataset, '/api/datasets/<owner>/<dataset>')
+    rest_api.add_resource(resources.DeriveDataset, '/api/datasets/<owner>/<dataset>/derive')
+    rest_api.add_resource(resources.Data, '/api/datasets/<owner>/<dataset>/data')
+    rest_api.add_resource(resources.Checksums, '/api/datasets/<owner>/<dataset>/checksums')
+    rest_api.add_resource(resources.Lineage, '/api/datasets/<owner>/<dataset>/lineage')
+    rest_api.add_resource(resources.Bookmarks, '/api/datasets/<owner>/<dataset>/bookmarks')
+    rest_api.add_resource(resources.Reviews, '/api/datasets/<owner>/<dataset>/reviews')
+    rest_api.add_resource(resources.Permission, '/api/datasets/<owner>/<dataset>/permissions')
+    rest_api.add_resource(resources.AccessRequest, '/api/datasets/<owner>/<dataset>/request')
+    rest_api.add_resource(resources.DirectAccess, '/api/datasets/<owner>/<dataset>/request/<request_id>')
+    rest_api.add_resource(resources.Search, '/api/search')
+    rest_api.add_resource(resources.UserBookmarks, '/api/user/<username>/bookmarks')
+    rest_api.add_resource(resources.UserUsage, '/api/user/<username>/usage')
+    rest_api.add_resource(resources.UserSearch, '/api/user/search')
+    rest_api.add_resource(resources.Notifications, '/api/notifications')
+    rest_api.add_resource(resources.NotificationStream, '/api/notifications/stream')
+    rest_api.add_resource(resources.Notification, '/api/notification/<notification_id>')
+    rest_api.add_resource(resources.Connections, '/api/user/<user_id>/connections')
+    rest_api.add_resource(resources.Connection, '/api/connection/<from_id>/<to_id>/<option>')
+    rest_api.add_resource(resources.Services, '/api/services')
+    rest_api.add_resource(resources.Service, '/api/service/<name>')
+    rest_api.add_resource(resources.TaxonomyImports, '/api/imports')
+    rest_api.add_resource(resources.TaxonomyImport, '/api/imports/<int:job_id>')
+
+    from nova import views
+
+    metrics.init_app(app)
+    profiler.init_app(app)
+    app.before_first_request(search.health.start)
+
+    # last, requests only skip registering once everything is in place
+    api = rest_api
+    return app
+
+
+def _register_on_first_request(wsgi_app):
+    # servers started with the plain `nova:app' have not called create_app()
+    def registered_wsgi_app(environ, start_response):
+        if api is None:
+            create_app()
+
+        return wsgi_app(environ, start_response)
+
+    return registered_wsgi_app
+
+
+app.wsgi_app = _register_on_first_request(app.wsgi_app)
@@ -0,0 +1,137 @@
+from flask import g
+from sqlalchemy import event, select, or_
+from nova import db
+from nova.models import (User, Dataset, Permission, DirectAccess, Membership,
+        EffectivePermission)
+
+
+# Public flags are stored with a NULL user, owners get full access and group
+# grants are expanded to one row per member, so that any access check is a
+# single lookup on (dataset_id, user_id).
+def rebuild(connection, dataset_ids):
+    if not dataset_ids:
+        return
+
+    dataset_ids = list(dataset_ids)
+    effective = EffectivePermission.__table__
+    permissions = Permission.__table__
+    direct = DirectAccess.__table__
+    memberships = Membership.__table__
+    grants = {}
+
+    def grant(dataset_id, user_id, flags):
+        current = grants.get((dataset_id, user_id), (False, False, False))
+        grants[(dataset_id, user_id)] = tuple(bool(a) or bool(b) for a, b in zip(current, flags))
+
+    connection.execute(effective.delete().where(effective.c.dataset_id.in_(dataset_ids)))
+
+    live = select([Dataset.__table__.c.id]).where(Dataset.__table__.c.id.in_(dataset_ids))
+    flags = [direct.c.can_read, direct.c.can_interact, direct.c.can_fork]
+
+    query = select([permissions.c.dataset_id, permissions.c.owner_id, permissions.c.can_read,
+                    permissions.c.can_interact, permissions.c.can_fork]).\
+        where(permissions.c.dataset_id.in_(live))
+
+    for row in connection.execute(query):
+        grant(row[0], None, row[2:])
+
+        if row[1] is not None:
+            grant(row[0], row[1], (True, True, True))
+
+    query = select([direct.c.dataset_id, direct.c.user_id] + flags).\
+        where(direct.c.dataset_id.in_(live)).\
+        where(direct.c.user_id != None)
+
+    for row in connection.execute(query):
+        grant(row[0], row[1], row[2:])
+
+    query = select([direct.c.dataset_id, memberships.c.user_id] + flags).\
+        select_from(direct.join(memberships, memberships.c.group_id == direct.c.group_id)).\
+        where(direct.c.dataset_id.in_(live))
+
+    for row in connection.execute(query):
+        grant(row[0], row[1], row[2:])
+
+    if grants:
+        connection.execute(effective.insert(),
+            [dict(dataset_id=d, user_id=u, can_read=f[0], can_interact=f[1], can_fork=f[2])
+             for (d, u), f in grants.items()])
+
+
+def rebuild_all(connection):
+    rebuild(connection, [row[0] for row in connection.execute(select([Dataset.__table__.c.id]))])
+
+
+@event.listens_for(db.session, 'before_flush')
+def delete_effective_permissions(session, context, instances):
+    # rows of deleted datasets and users must go before them, databases that
+    # check foreign keys immediately reject the flush otherwise
+    effective = EffectivePermission.__table__
+    dataset_ids = [obj.id for obj in session.deleted if isinstance(obj, Dataset) and obj.id]
+    user_ids = [obj.id for obj in session.deleted if isinstance(obj, User) and obj.id]
+
+    if dataset_ids:
+        session.execute(effective.delete().where(effective.c.dataset_id.in_(dataset_ids)))
+
+    if user_ids:
+        session.execute(effective.delete().where(effective.c.user_id.in_(user_ids)))
+
+
+@event.listens_for(db.session, 'after_flush')
+def update_effective_permissions(session, context):
+    dataset_ids = set()
+    group_ids = set()
+
+    for obj in session.new | session.deleted:
+        if isinstance(obj, Dataset):
+            dataset_ids.add(obj.id)
+
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, (Permission, DirectAccess)):
+            dataset_ids.add(obj.dataset_id)
+        elif isinstance(obj, Membership):
+            group_ids.add(obj.group_id)
+
+    connection = session.connection()
+    dataset_ids.discard(None)
+    group_ids.discard(None)
+
+    if group_ids:
+        direct = DirectAccess.__table__
+        query = select([direct.c.dataset_id]).where(direct.c.group_id.in_(group_ids))
+        dataset_ids.update(row[0] for row in connection.execute(query))
+
+    if dataset_ids:
+        rebuild(connection, dataset_ids)
+
+        # drop cached checks of this request, they may be stale now
+        if g:
+            g.pop('effective_permissions', None)
+
+
+def get_permissions(user, dataset):
+    cache = g.setdefault('effective_permissions', {}) if g else {}
+    key = (user.id, dataset.id)
+
+    if key not in cache:
+        rows = db.session.query(EffectivePermission.can_read,
+                                EffectivePermission.can_interact,
+                                EffectivePermission.can_fork).\
+            filter(EffectivePermission.dataset_id == dataset.id).\
+            filter(or_(EffectivePermission.user_id == user.id,
+                       EffectivePermission.user_id == None)).\
+            all()
+
+        cache[key] = {'read': any(r[0] for r in rows),
+                      'interact': any(r[1] for r in rows),
+                      'fork': any(r[2] for r in rows)}
+
+    return cache[key]
+
+
+def readable(query, user):
+    return query.join(EffectivePermission, EffectivePermission.dataset_id == Dataset.id).\
+        filter(or_(EffectivePermission.user_id == user.id,
+                   EffectivePermission.user_id == None)).\
+        filter(EffectivePermission.can_read == True).\
+        distinct()
@@ -0,0 +1,160 @@
+import json
+import time
+import uuid
+import hashlib
+import threading
+from functools import wraps
+from flask import request, Response
+from flask_login import current_user
+from sqlalchemy import event, inspect
+from nova import app, db, models, cache
+
+
+NO_CACHE = 'private, no-cache'
+
+
+@event.listens_for(db.session, 'before_flush')
+def bump_dataset_versions(session, context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, models.Dataset) and session.is_modified(obj, include_collections=False):
+            obj.version = models.Dataset.version + 1
+
+
+def etag_of(*parts):
+    return hashlib.md5(repr(parts)).hexdigest()
+
+
+def content_etag(data):
+    return hashlib.md5(json.dumps(data, sort_keys=True)).hexdigest()
+
+
+def matches(etag):
+    return etag in request.if_none_match
+
+
+def headers(etag, cache_control=NO_CACHE):
+    return {'ETag': '"{}"'.format(etag), 'Cache-Control': cache_control}
+
+
+def not_modified(etag, cache_control=NO_CACHE):
+    return Response(status=304, headers=headers(etag, cache_control))
+
+
+def conditional(data, etag=None, cache_control=NO_CACHE):
+    etag = etag or content_etag(data)
+
+    if matches(etag):
+        return not_modified(etag, cache_control)
+
+    return data, 200, headers(etag, cache_control)
+
+
+class PageStats(object):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.rendered = 0.0
+        self.saved = 0.0
+        self.lock = threading.Lock()
+
+    def hit(self, elapsed):
+        with self.lock:
+            self.hits += 1
+            self.saved += elapsed
+
+    def miss(self, elapsed):
+        with self.lock:
+            self.misses += 1
+            self.rendered += elapsed
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return dict(hits=self.hits, misses=self.misses,
+                        hit_rate=float(self.hits) / total if total else 0.0,
+                        rendered=self.rendered, saved=self.saved)
+
+
+page_stats = PageStats()
+
+
+def generation_key(table):
+    return 'nova/generation/{}'.format(table)
+
+
+def cached_page(*dependencies):
+    """Cache rendered pages per user until one of the dependencies changes."""
+    tables = sorted(model.__tablename__ for model in dependencies)
+    keys = [generation_key(table) for table in tables]
+
+    def wrapper(func):
+        @wraps(func)
+        def decorated_view(*args, **kwargs):
+            if app.config['CACHE_TYPE'] == 'null':
+                return func(*args, **kwargs)
+
+            generations = cache.get_many(*keys)
+            key = 'nova/page/{}/{}'.format(request.endpoint,
+                    etag_of(current_user.get_id(), request.full_path, generations))
+            entry = cache.get(key)
+
+            if entry is not None:
+                body, elapsed = entry
+                page_stats.hit(elapsed)
+                return body
+
+            start = time.time()
+            result = func(*args, **kwargs)
+            elapsed = time.time() - start
+            page_stats.miss(elapsed)
+
+            # only plain pages, not redirects or error responses
+            if isinstance(result, basestring):
+                cache.set(key, (result, elapsed))
+
+            return result
+        return decorated_view
+    return wrapper
+
+
+def invalidate(*tables):
+    """Drop cached pages that depend on any of the tables."""
+    cache.set_many({generation_key(table): uuid.uuid4().hex for table in tables}, timeout=0)
+
+
+def touch(*tables):
+    """Invalidate pages that depend on tables once the session commits, for
+    changes made with Core statements that the flush events do not see."""
+    db.session.info.setdefault('changed_tables', set()).update(tables)
+
+
+@event.listens_for(db.session, 'after_flush')
+def collect_changed_tables(session, context):
+    changed = session.info.setdefault('changed_tables', set())
+
+    # joined subclasses such as SampleScan change their base table too
+    for obj in session.new | session.dirty | session.deleted:
+        changed.update(table.name for table in inspect(obj).mapper.tables)
+
+
+@event.listens_for(db.session, 'after_bulk_update')
+@event.listens_for(db.session, 'after_bulk_delete')
+def collect_bulk_changed_tables(context):
+    # Query.update() and Query.delete() do not flush objects
+    changed = context.session.info.setdefault('changed_tables', set())
+    changed.update(table.name for table in context.mapper.tables)
+
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_pages(session):
+    changed = session.info.pop('changed_tables', None)
+
+    # bump after commit so that no page rendered from uncommitted data is
+    # stored under the new generation
+    if changed:
+        invalidate(*changed)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_changed_tables(session):
+    session.info.pop('changed_tables', None)
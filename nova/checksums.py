@@ -0,0 +1,244 @@
+import os
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict
+from nova import app, db, models, metrics, garbage
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+CHUNK_SIZE = 1024 * 1024
+
+MANIFEST_CACHE_SIZE = 16
+
+
+class ChecksumMismatch(Exception):
+
+    pass
+
+
+def algorithm():
+    return app.config['NOVA_CHECKSUM_ALGORITHM']
+
+
+def new():
+    name = algorithm()
+
+    if name == 'xxh64':
+        if xxhash is None:
+            raise RuntimeError("xxh64 checksums require `pip install xxhash'")
+
+        return xxhash.xxh64()
+
+    return hashlib.new(name)
+
+
+def manifest_path(path):
+    return os.path.join(path, '.nova', 'checksums.{}'.format(algorithm()))
+
+
+def load(path):
+    """Return the manifest of the dataset at path as a dict mapping relative
+    paths to hex digests. It is stored in the format of sha256sum and friends
+    so that downloaded data can be checked with e.g. `sha256sum -c'."""
+    sums = {}
+
+    try:
+        with open(manifest_path(path)) as f:
+            for line in f:
+                digest, _, name = line.rstrip('\n').partition('  ')
+
+                if name:
+                    sums[name] = digest
+    except IOError:
+        pass
+
+    return sums
+
+
+class ManifestCache(object):
+    # Downloads of single files only need one entry, keep the manifests of
+    # recently used datasets parsed until they are replaced on disk.
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path, name):
+        filename = manifest_path(path)
+
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+
+        key = (stat.st_ino, stat.st_mtime, stat.st_size)
+
+        with self.lock:
+            entry = self.entries.pop(filename, None)
+
+        if entry is None or entry[0] != key:
+            entry = (key, load(path))
+
+        with self.lock:
+            self.entries[filename] = entry
+
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+        return entry[1].get(name)
+
+
+manifests = ManifestCache(MANIFEST_CACHE_SIZE)
+
+
+def save(path, sums):
+    filename = manifest_path(path)
+
+    if not os.path.isdir(os.path.dirname(filename)):
+        os.makedirs(os.path.dirname(filename))
+
+    with open(filename + '.tmp', 'w') as f:
+        for name in sorted(sums):
+            # nova's own metadata changes without the data changing
+            if not name.startswith('.nova' + os.sep):
+                f.write('{}  {}\n'.format(sums[name], name))
+
+    os.rename(filename + '.tmp', filename)
+
+
+def verify_upload(staging, sums):
+    """Compare the checksums computed while extracting an upload with those
+    of a manifest that came with it, e.g. from an earlier download."""
+    claimed = load(staging)
+    damaged = sorted(name for name, digest in sums.items() if claimed.get(name, digest) != digest)
+
+    if damaged:
+        raise ChecksumMismatch("Checksums of {} do not match the manifest".format(', '.join(damaged[:10])))
+
+
+def checksum(filename, throttle, limit=0):
+    """Return the hex digest of filename and the bytes read. The digest is
+    None if reading stopped after limit bytes."""
+    digest = new()
+    read = 0
+
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), ''):
+            digest.update(chunk)
+            read += len(chunk)
+            throttle(len(chunk))
+
+            if limit and read >= limit:
+                # the file may end exactly here
+                return (digest.hexdigest() if not f.read(1) else None), read
+
+    return digest.hexdigest(), read
+
+
+def verify(path, throttle, budget=0):
+    """Read the files of the dataset at path and compare them with the
+    manifest. Returns the bytes read, the damaged, missing or unreadable files
+    and whether every file was read within budget bytes. Files without
+    checksum are added to the manifest."""
+    manifest = load(path)
+    found = set()
+    damaged = []
+    added = False
+    read = 0
+
+    for root, dirs, files in os.walk(path):
+        if root == path:
+            dirs[:] = [d for d in dirs if d != '.nova' and not d.startswith('.upload-')]
+
+        for filename in files:
+            full = os.path.join(root, filename)
+            name = os.path.relpath(full, path)
+
+            if os.path.islink(full):
+                continue
+
+            if budget and read >= budget:
+                return read, sorted(damaged), False
+
+            try:
+                digest, size = checksum(full, throttle, budget - read if budget else 0)
+            except (IOError, OSError) as e:
+                app.logger.error("Cannot read {}: {}".format(full, e))
+                found.add(name)
+                damaged.append(name)
+                continue
+
+            read += size
+
+            if digest is None:
+                return read, sorted(damaged), False
+
+            found.add(name)
+
+            if name not in manifest:
+                manifest[name] = digest
+                added = True
+            elif manifest[name] != digest:
+                damaged.append(name)
+
+    if added:
+        save(path, manifest)
+
+    return read, sorted(damaged + list(set(manifest) - found)), True
+
+
+def claim(dataset_id, verified):
+    # several workers may run the scrubber, only one verifies a dataset. The
+    # claim moves it to the back of the queue, so a dataset that does not fit
+    # into the budget does not block the others.
+    datasets = models.Dataset.__table__
+    unchanged = datasets.c.verified.is_(None) if verified is None else datasets.c.verified == verified
+    result = db.session.execute(datasets.update().
+                                where(datasets.c.id == dataset_id).where(unchanged).
+                                values(verified=datetime.datetime.utcnow()))
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def scrub():
+    """Verify closed datasets, least recently verified first, until the I/O
+    budget of this run is spent."""
+    throttle = garbage.Throttle(app.config['NOVA_SCRUB_RATE'])
+    budget = app.config['NOVA_SCRUB_BUDGET']
+    spent = 0
+
+    datasets = db.session.query(models.Dataset.id, models.Dataset.path, models.Dataset.verified).\
+        filter(models.Dataset.closed == True).\
+        order_by(models.Dataset.verified.isnot(None), models.Dataset.verified).all()
+
+    for dataset_id, path, verified in datasets:
+        if budget and spent >= budget:
+            break
+
+        if not path or not os.path.isdir(path) or not claim(dataset_id, verified):
+            continue
+
+        read, damaged, complete = verify(path, throttle, budget - spent if budget else 0)
+        spent += read
+        metrics.scrubbed_bytes.inc(read)
+
+        if damaged:
+            metrics.damaged_files.inc(len(damaged))
+            app.logger.error("{} damaged or missing files in {}: {}".format(
+                len(damaged), path, ', '.join(damaged[:10])))
+
+        if not complete:
+            # the claim moved it to the back, damaged keeps the last complete result
+            app.logger.warning("Scrub budget spent before {} was verified completely".format(path))
+            break
+
+        # not a change of the dataset itself, so bypass the version bump
+        models.Dataset.query.filter(models.Dataset.id == dataset_id).\
+            update(dict(verified=datetime.datetime.utcnow(), damaged=len(damaged)),
+                   synchronize_session=False)
+        db.session.commit()
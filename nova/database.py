@@ -0,0 +1,85 @@
+import os
+import sqlite3
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, orm
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.expression import Select
+
+
+def configure(app):
+    default = 'sqlite:///' + os.path.join(app.config['NOVA_ROOT_PATH'], 'nova.db')
+    uri = app.config.setdefault('SQLALCHEMY_DATABASE_URI', default)
+
+    if not uri.startswith('sqlite'):
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', app.config['NOVA_DATABASE_POOL'])
+
+    pragmas = app.config['NOVA_SQLITE_PRAGMAS']
+
+    @event.listens_for(Engine, 'connect')
+    def set_sqlite_pragmas(connection, record):
+        if not isinstance(connection, sqlite3.Connection):
+            return
+
+        cursor = connection.cursor()
+
+        for name, value in pragmas:
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+
+        cursor.close()
+
+
+class Router(object):
+    # In WAL mode SQLite readers never block the writer and vice versa, so
+    # reads get their own pool while all writes share one connection and
+    # queue in the pool instead of spinning on the busy timeout.
+
+    def __init__(self, uri, readers=4, timeout=30):
+        args = dict(poolclass=QueuePool, max_overflow=0, pool_timeout=timeout,
+                    connect_args={'check_same_thread': False})
+
+        self.writer = create_engine(uri, pool_size=1, **args)
+        self.reader = create_engine(uri, pool_size=readers, **args)
+
+        @event.listens_for(self.reader, 'connect')
+        def set_query_only(connection, record):
+            connection.execute('PRAGMA query_only = ON')
+
+
+class RoutingSession(SignallingSession):
+    def __init__(self, db, **options):
+        self.router = db.router
+        SignallingSession.__init__(self, db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self.router is None:
+            return SignallingSession.get_bind(self, mapper, clause)
+
+        # once this transaction wrote, keep reading from the writer so that
+        # it sees its own changes
+        if self._flushing or self.info.get('wrote') or not isinstance(clause, Select):
+            self.info['wrote'] = True
+            return self.router.writer
+
+        return self.router.reader
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+@event.listens_for(RoutingSession, 'after_rollback')
+def reset_route(session):
+    session.info.pop('wrote', None)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def __init__(self, app=None, **kwargs):
+        self.router = None
+        SQLAlchemy.__init__(self, app, **kwargs)
+
+        uri = app.config['SQLALCHEMY_DATABASE_URI']
+        readers = app.config['NOVA_SQLITE_READERS']
+
+        if uri.startswith('sqlite') and not ':memory:' in uri and readers > 0:
+            self.router = Router(uri, readers)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
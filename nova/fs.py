@@ -1,4 +1,5 @@
 import os
+from nova.profiler import timed
 
 
 class Filesystem(object):
@@ -13,12 +14,15 @@ class Filesystem(object):
         except OSError:
             return []
 
+    @timed('fs')
     def get_files(self, dataset, path):
         return [(os.path.basename(e), os.stat(e).st_size) for e in self.get_entries(dataset, path) if not os.path.isdir(e)]
 
+    @timed('fs')
     def get_dirs(self, dataset, path):
         return [os.path.basename(e) for e in self.get_entries(dataset, path) if os.path.isdir(e)]
 
+    @timed('fs')
     def get_statistics(self, datasets):
         num_files = 0
         total_size = 0
@@ -36,6 +40,7 @@ class Filesystem(object):
     def path_of(self, dataset):
         return os.path.join(self.path, dataset.path)
 
+    @timed('fs')
     def create_workspace(self, user, collection, name, path=None):
         if path is not None:
             return os.path.abspath(path)
@@ -0,0 +1,252 @@
+import os
+import time
+import errno
+import datetime
+from nova import app, db, models, metrics, quota
+
+
+# a collector that died while reclaiming leaves its tombstone running, give
+# it back to the next run after this long
+STALE = datetime.timedelta(hours=6)
+
+# data that is still used rarely becomes free soon, check it again after
+# twice the time of the previous check but at least once a day
+MAX_BACKOFF = datetime.timedelta(days=1)
+
+
+def inside(path, directory):
+    return path == directory or path.startswith(directory.rstrip(os.sep) + os.sep)
+
+
+class Throttle(object):
+    # Removing millions of files is pure metadata I/O that competes with
+    # acquisition and the web frontend on shared storage, so stay below
+    # `rate' operations (or bytes) per second.
+    def __init__(self, rate):
+        self.rate = rate
+        self.start = time.time()
+        self.count = 0
+
+    def __call__(self, amount=1):
+        self.count += amount
+
+        if self.rate:
+            delay = self.start + self.count / float(self.rate) - time.time()
+
+            if delay > 0:
+                time.sleep(delay)
+
+
+def ignore_missing(func, path):
+    try:
+        func(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def remove(path, throttle):
+    """Remove path bottom-up and return the number of files and the bytes
+    actually freed, hard links still in use elsewhere free nothing."""
+    files, size = 0, 0
+
+    for root, dirs, filenames in os.walk(path, topdown=False):
+        for name in filenames:
+            filename = os.path.join(root, name)
+
+            try:
+                stat = os.lstat(filename)
+            except OSError:
+                continue
+
+            ignore_missing(os.unlink, filename)
+            files += 1
+            size += stat.st_size if stat.st_nlink == 1 else 0
+            throttle()
+
+        for name in dirs:
+            directory = os.path.join(root, name)
+            ignore_missing(os.unlink if os.path.islink(directory) else os.rmdir, directory)
+            throttle()
+
+    ignore_missing(os.rmdir, path)
+    return files, size
+
+
+def prune(path, root):
+    # drop parents left empty so that sweeps do not report them as orphans
+    parent = os.path.dirname(path)
+
+    while parent != root and inside(parent, root):
+        try:
+            os.rmdir(parent)
+        except OSError:
+            break
+
+        parent = os.path.dirname(parent)
+
+
+def descendants(dataset_id):
+    ids, frontier = set(), set([dataset_id])
+
+    while frontier:
+        query = db.session.query(models.Process.destination_id).\
+            filter(models.Process.source_id.in_(frontier))
+        frontier = set(i for i, in query) - ids
+        ids |= frontier
+
+    return ids
+
+
+def user_of(tombstone, throttle):
+    """Return the path of a live dataset that still uses the tombstoned data,
+    either because the paths overlap or because a derived dataset links into
+    it."""
+    path = os.path.abspath(tombstone.path)
+    parents = []
+    parent = os.path.dirname(path)
+
+    while parent != os.path.dirname(parent):
+        parents.append(parent)
+        parent = os.path.dirname(parent)
+
+    overlapping = db.session.query(models.Dataset.path).\
+        filter(db.or_(models.Dataset.path == path,
+                      models.Dataset.path.startswith(path + os.sep),
+                      models.Dataset.path.in_(parents))).first()
+
+    if overlapping is not None:
+        return overlapping[0]
+
+    if tombstone.dataset_id is None:
+        return None
+
+    ids = descendants(tombstone.dataset_id)
+    real = os.path.realpath(path)
+
+    if not ids:
+        return None
+
+    for other, in db.session.query(models.Dataset.path).filter(models.Dataset.id.in_(ids)):
+        for root, dirs, files in os.walk(other):
+            for name in dirs + files:
+                link = os.path.join(root, name)
+                throttle()
+
+                if os.path.islink(link) and inside(os.path.realpath(link), real):
+                    return other
+
+
+def claimable(now):
+    tombstones = models.Tombstone.__table__
+    return db.or_(tombstones.c.status == 'pending',
+                  db.and_(tombstones.c.status == 'shared',
+                          db.or_(tombstones.c.retry.is_(None), tombstones.c.retry <= now)),
+                  db.and_(tombstones.c.status == 'running', tombstones.c.started < now - STALE))
+
+
+def backoff(tombstone, now):
+    tombstone.checks = (tombstone.checks or 0) + 1
+    delay = datetime.timedelta(seconds=app.config['NOVA_GC_INTERVAL']) * 2 ** min(tombstone.checks - 1, 16)
+    tombstone.retry = now + min(delay, MAX_BACKOFF)
+
+
+def claim(tombstone, now):
+    # several workers may run the collector, only one reclaims a tombstone
+    tombstones = models.Tombstone.__table__
+    result = db.session.execute(tombstones.update().
+                                where(tombstones.c.id == tombstone.id).where(claimable(now)).
+                                values(status='running', started=now))
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def collect():
+    """Reclaim the data of tombstoned datasets. Tombstones whose data is still
+    used are kept and checked again on the next run."""
+    root = os.path.abspath(app.config['NOVA_ROOT_PATH'])
+    throttle = Throttle(app.config['NOVA_GC_RATE'])
+    now = datetime.datetime.utcnow()
+    tombstones = models.Tombstone.query.filter(claimable(now)).\
+        order_by(models.Tombstone.created).all()
+
+    for tombstone in tombstones:
+        if not claim(tombstone, now):
+            continue
+
+        db.session.refresh(tombstone)
+        path = os.path.abspath(tombstone.path)
+
+        if not inside(path, root) or path == root:
+            app.logger.warning("Keeping {}, it is not below {}".format(path, root))
+            tombstone.status = 'kept'
+            db.session.commit()
+            continue
+
+        other = user_of(tombstone, throttle)
+
+        if other is not None:
+            app.logger.info("Keeping {} for now, {} still uses it".format(path, other))
+            tombstone.status = 'shared'
+            backoff(tombstone, now)
+            db.session.commit()
+            continue
+
+        try:
+            files, size = remove(path, throttle)
+            prune(path, root)
+        except OSError:
+            app.logger.exception("Cannot reclaim {}".format(path))
+            tombstone.status = 'pending'
+            db.session.commit()
+            continue
+
+        app.logger.info("Reclaimed {} bytes in {} files of {}".format(size, files, path))
+        metrics.reclaimed_bytes.inc(size)
+        tombstone.status = 'done'
+        tombstone.files = files
+        tombstone.size = size
+        tombstone.reclaimed = datetime.datetime.utcnow()
+        db.session.commit()
+
+
+def sweep():
+    """Reconcile NOVA_ROOT_PATH with the datasets and return (path, files,
+    bytes) of directories that belong to no dataset."""
+    root = os.path.abspath(app.config['NOVA_ROOT_PATH'])
+    paths = set(os.path.abspath(p) for p, in db.session.query(models.Dataset.path) if p)
+    paths.update(os.path.abspath(p) for p, in db.session.query(models.Tombstone.path).
+                 filter(models.Tombstone.status != 'done'))
+    ancestors = set()
+
+    for path in paths:
+        while inside(path, root) and path != root:
+            path = os.path.dirname(path)
+            ancestors.add(path)
+
+    orphans = []
+
+    for directory, dirs, files in os.walk(root):
+        descend = []
+
+        for name in dirs:
+            path = os.path.join(directory, name)
+
+            # .imports, .profiles and friends belong to nova itself
+            if name.startswith('.') or path in paths or os.path.islink(path):
+                continue
+
+            if path in ancestors:
+                descend.append(name)
+            else:
+                orphans.append((path,) + quota.measure(path))
+
+        dirs[:] = descend
+
+    return orphans
+
+
+def bury(paths):
+    """Tombstone orphaned directories so that the collector reclaims them."""
+    db.session.add_all(models.Tombstone(path=path, name=os.path.basename(path)) for path in paths)
+    db.session.commit()
@@ -1,6 +1,90 @@
 import os
+from multiprocessing.pool import ThreadPool
 from flask import abort
-from nova import app, db, fs, models
+from sqlalchemy import select, literal
+from sqlalchemy.orm import joinedload
+from nova import app, db, fs, models, access, caching, quota
+
+
+def with_owner(relationship):
+    return joinedload(relationship).joinedload(models.Dataset.permissions).\
+        joinedload(models.Permission.owner)
+
+
+def get_bookmarks(username):
+    return db.session.query(models.Bookmark).\
+        join(models.User, models.Bookmark.user_id == models.User.id).\
+        filter(models.User.name == username).\
+        options(with_owner(models.Bookmark.dataset),
+                joinedload(models.Bookmark.dataset).joinedload(models.Dataset.collection))
+
+
+def get_collection_datasets(collection):
+    return db.session.query(models.Dataset).\
+        filter(models.Dataset.collection_id == collection.id).\
+        options(joinedload(models.Dataset.permissions).joinedload(models.Permission.owner))
+
+
+def get_reviews(dataset):
+    return db.session.query(models.Review).\
+        filter(models.Review.dataset_id == dataset.id).\
+        options(joinedload(models.Review.user))
+
+
+def get_lineage_edges(dataset, descendants=True, depth=None):
+    # Walk the process graph with one recursive query. UNION rather than
+    # UNION ALL drops duplicate rows where derivations fork and merge again,
+    # and the depth bound stops the walk on cyclic data.
+    processes = models.Process.__table__
+    depth = min(depth or app.config['NOVA_LINEAGE_MAX_DEPTH'], app.config['NOVA_LINEAGE_MAX_DEPTH'])
+    start, follow = (processes.c.source_id, processes.c.destination_id) if descendants else \
+        (processes.c.destination_id, processes.c.source_id)
+
+    lineage = select([processes.c.source_id, processes.c.destination_id, literal(1).label('depth')]).\
+        where(start == dataset.id).\
+        cte('lineage', recursive=True)
+
+    previous = lineage.alias()
+    previous_node = previous.c.destination_id if descendants else previous.c.source_id
+
+    lineage = lineage.union(
+        select([processes.c.source_id, processes.c.destination_id, previous.c.depth + 1]).
+        where(start == previous_node).
+        where(previous.c.depth < depth))
+
+    edges = {}
+    result = db.session.execute(select([lineage.c.source_id, lineage.c.destination_id, lineage.c.depth]))
+
+    # Python 2's sqlite3 reports no columns for a recursive query without
+    # rows, SQLAlchemy then closes the result right away
+    rows = result.fetchall() if result.returns_rows else []
+
+    for source, destination, level in rows:
+        edges[(source, destination)] = min(level, edges.get((source, destination), level))
+
+    return edges
+
+
+def get_lineage(dataset, ancestors=True, descendants=True, depth=None):
+    edges = {}
+
+    if ancestors:
+        edges.update(get_lineage_edges(dataset, descendants=False, depth=depth))
+
+    if descendants:
+        edges.update(get_lineage_edges(dataset, descendants=True, depth=depth))
+
+    ids = set([dataset.id])
+
+    for source, destination in edges:
+        ids.update((source, destination))
+
+    datasets = db.session.query(models.Dataset).\
+        filter(models.Dataset.id.in_(ids)).\
+        options(joinedload(models.Dataset.permissions).joinedload(models.Permission.owner)).\
+        all()
+
+    return datasets, edges
 
 
 def create_collection(name, user, description=None):
@@ -30,24 +114,160 @@ def create_dataset(dtype, name, user, collection, path=None, **kwargs):
     dataset = dtype(name=name, path=abspath, collection=collection, **kwargs)
     permission = models.Permission(owner=user, dataset=dataset, can_read=True,
                                    can_interact=True, can_fork=False)
+
+    if path is not None:
+        files, size = quota.measure(abspath)
+        quota.charge(dataset, size, files)
+
     db.session.add_all([dataset, permission])
     db.session.commit()
     return dataset
 
 
+def chunked(items, size=500):
+    # keeps IN clauses below SQLite's limit of bound parameters
+    items = list(items)
+
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def create_datasets(user, specs):
+    """Create datasets owned by user from dicts with name, collection and
+    optionally description, path and created. All datasets are inserted in
+    one transaction. Returns a (dataset, error) tuple for each spec."""
+    results = [(None, None)] * len(specs)
+    collections = {}
+    existing = set()
+
+    for names in chunked(set(spec['collection'] for spec in specs)):
+        query = models.Collection.query.filter(models.Collection.name.in_(names))
+        collections.update((c.name, c) for c in query)
+
+    for names in chunked(set(spec['name'] for spec in specs)):
+        query = db.session.query(models.Dataset.name).join(models.Permission).\
+            filter(models.Permission.owner_id == user.id).\
+            filter(models.Dataset.name.in_(names))
+        existing.update(name for name, in query)
+
+    valid = []
+
+    for i, spec in enumerate(specs):
+        if spec['collection'] not in collections:
+            results[i] = (None, "Collection `{}' does not exist".format(spec['collection']))
+        elif spec['name'] in existing:
+            results[i] = (None, "Dataset `{}' already exists".format(spec['name']))
+        else:
+            existing.add(spec['name'])
+            valid.append(i)
+
+    def create_workspace(i):
+        spec = specs[i]
+
+        try:
+            path = fs.create_workspace(user, collections[spec['collection']], spec['name'], spec.get('path'))
+        except OSError as e:
+            return i, None, None, "Cannot create workspace: {}".format(e.strerror)
+
+        # existing data counts towards the quotas like for single datasets
+        return i, path, quota.measure(path) if spec.get('path') else None, None
+
+    # creating directories is I/O bound and dominates on network filesystems
+    pool = ThreadPool(app.config['NOVA_BULK_WORKERS'])
+
+    try:
+        workspaces = pool.map(create_workspace, valid)
+    finally:
+        pool.close()
+
+    datasets = []
+    created_paths = []
+    usage = {}
+
+    for i, path, measured, error in workspaces:
+        if error is not None:
+            results[i] = (None, error)
+            continue
+
+        spec = specs[i]
+        collection = collections[spec['collection']]
+        optional = dict((key, spec[key]) for key in ('description', 'created') if spec.get(key))
+
+        if measured is not None:
+            optional.update(file_count=measured[0], size=measured[1])
+            usage[collection] = usage.get(collection, 0) + measured[1]
+
+        dataset = models.Dataset(name=spec['name'], path=path, collection_id=collection.id, **optional)
+        datasets.append((i, dataset))
+
+        if not spec.get('path'):
+            created_paths.append(path)
+
+    try:
+        db.session.bulk_save_objects([d for _, d in datasets], return_defaults=True)
+        db.session.bulk_insert_mappings(models.Permission,
+            [dict(owner_id=user.id, dataset_id=d.id, can_read=True, can_interact=True,
+                  can_fork=False) for _, d in datasets])
+
+        # bulk operations bypass the session events that keep these up to date
+        connection = db.session.connection()
+
+        for ids in chunked([d.id for _, d in datasets]):
+            access.rebuild(connection, ids)
+
+        # one update per counter instead of one per dataset
+        quota.add(user, sum(usage.values()))
+
+        for collection, size in usage.items():
+            quota.add(collection, size)
+
+        db.session.commit()
+    except:
+        db.session.rollback()
+
+        for path in created_paths:
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+
+        raise
+
+    caching.invalidate('datasets', 'permissions')
+
+    for i, dataset in datasets:
+        results[i] = (dataset, None)
+
+    return results
+
+
+def delete_dataset(dataset):
+    """Replace the dataset by a tombstone, its data is reclaimed in the
+    background by the garbage collector."""
+    tombstone = models.Tombstone(dataset_id=dataset.id, name=dataset.name, path=fs.path_of(dataset))
+    quota.charge(dataset, -(dataset.size or 0), -(dataset.file_count or 0))
+    db.session.add(tombstone)
+    db.session.delete(dataset)
+    db.session.commit()
+    return tombstone
+
+
 def derive_dataset(dtype, dataset, user, name, path=None, permissions=[True,True,False]):
     root = app.config['NOVA_ROOT_PATH']
     if path is None:
         path = os.path.join(root, dataset.collection.name, name)
         abspath = os.path.join(root, path)
         os.makedirs(abspath)
+        files, size = 0, 0
     else:
         # TODO: verify path
         abspath = os.path.abspath(path)
+        files, size = quota.measure(abspath)
     derived_dataset = dtype(name=name, path=abspath, collection=dataset.collection, description=dataset.description)
     derivation = models.Derivation(source=dataset, destination=derived_dataset, collection=dataset.collection)
     permission = models.Permission(owner=user, dataset=derived_dataset, can_read=permissions[0],
                                    can_interact=permissions[1], can_fork=permissions[2])
+    quota.charge(derived_dataset, size, files)
     db.session.add_all([derived_dataset, derivation, permission])
     db.session.commit()
     return derived_dataset
@@ -1,6 +1,11 @@
 import os
 import io
+import shutil
 import tarfile
+import tempfile
+
+
+CHUNK_SIZE = 1024 * 1024
 
 
 def create_tar(path):
@@ -26,3 +31,100 @@ def extract_tar(fileobj, path):
     tar = tarfile.open(mode='r:gz', fileobj=fileobj)
     tar.extractall(path)
     tar.close()
+
+
+class Counter(object):
+    # counts the bytes tarfile reads from a request stream
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.count += len(data)
+        return data
+
+
+def extract_stream(stream, path, admit=None, digest=None, check=None):
+    """Extract a gzipped tar from a stream without buffering it. Members are
+    staged in a hidden directory and only moved into path once the archive
+    was read completely, links and special files are skipped.
+
+    admit is called with the growth of path in bytes before each file.
+    digest returns a new hash object for the checksum of each file.
+    check is called with the staging directory, checksums, files and growth.
+
+    admit and check may raise to abort, leaving path untouched. Returns the
+    number of new files, the growth in bytes and the checksums."""
+    staging = tempfile.mkdtemp(prefix='.upload-', dir=path)
+    names = []
+    sums = {}
+    files, size = 0, 0
+
+    try:
+        tar = tarfile.open(mode='r|gz', fileobj=stream)
+
+        for member in tar:
+            name = os.path.normpath(member.name)
+
+            if os.path.isabs(name) or name == '..' or name.startswith('..' + os.sep):
+                continue
+
+            # links could point anywhere once moved into path
+            if not (member.isfile() or member.isdir()):
+                continue
+
+            if member.isfile():
+                target = os.path.join(path, name)
+                existing = os.lstat(target).st_size if os.path.isfile(target) else None
+                files += 1 if existing is None else 0
+                size += member.size - (existing or 0)
+
+                if admit is not None:
+                    admit(size)
+
+            if member.isfile() and digest is not None:
+                # hash while writing, so that checksums never need another read
+                sums[name] = extract_file(tar, member, os.path.join(staging, name), digest())
+            else:
+                tar.extract(member, staging)
+
+            if name not in names:
+                names.append(name)
+
+        tar.close()
+
+        if check is not None:
+            check(staging, sums, files, size)
+
+        for name in names:
+            source, target = os.path.join(staging, name), os.path.join(path, name)
+
+            if os.path.isdir(source):
+                if not os.path.isdir(target):
+                    os.makedirs(target)
+            else:
+                if not os.path.isdir(os.path.dirname(target)):
+                    os.makedirs(os.path.dirname(target))
+
+                os.rename(source, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    return files, size, sums
+
+
+def extract_file(tar, member, target, digest):
+    source = tar.extractfile(member)
+
+    if not os.path.isdir(os.path.dirname(target)):
+        os.makedirs(os.path.dirname(target))
+
+    with open(target, 'wb') as f:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), ''):
+            digest.update(chunk)
+            f.write(chunk)
+
+    os.chmod(target, member.mode & 07777)
+    os.utime(target, (member.mtime, member.mtime))
+    return digest.hexdigest()
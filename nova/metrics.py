@@ -0,0 +1,445 @@
+import os
+import json
+import time
+import errno
+import fcntl
+import threading
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from celery import signals
+from nova import app
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+TASK_BUCKETS = DEFAULT_BUCKETS + (30.0, 60.0, 300.0, 900.0, 3600.0)
+
+# seconds a change may take to show up in the metrics of other processes
+DUMP_INTERVAL = 1.0
+
+# values of exited processes, added up so that counters never go back
+EXITED = 'exited.json'
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ''
+
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return '{' + ','.join('{}="{}"'.format(k, escape(v)) for k, v in pairs) + '}'
+
+
+class Metric(object):
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        self.registry = None
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def changed(self):
+        if self.registry is not None:
+            self.registry.changed()
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(key), self.copy(value)] for key, value in self.values.items()]
+
+    def combine(self, snapshots):
+        values = {}
+
+        for snapshot in snapshots:
+            for key, value in snapshot:
+                key = tuple(key)
+                values[key] = self.merge(values[key], value) if key in values else value
+
+        return values
+
+    def render(self, others=()):
+        values = self.combine([self.snapshot()] + list(others))
+        lines = ['# HELP {} {}'.format(self.name, self.documentation),
+                 '# TYPE {} {}'.format(self.name, self.type)]
+
+        for key, value in sorted(values.items()):
+            lines.extend(self.samples(zip(self.labels, key), value))
+
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+        self.changed()
+
+    def copy(self, value):
+        return value
+
+    def merge(self, value, other):
+        return value + other
+
+    def samples(self, labels, value):
+        return ['{}{} {}'.format(self.name, format_labels(labels), value)]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+
+            counts, total, count = self.values[key]
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+
+            self.values[key][1:] = [total + value, count + 1]
+
+        self.changed()
+
+    def copy(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+    def merge(self, value, other):
+        return [[a + b for a, b in zip(value[0], other[0])], value[1] + other[1], value[2] + other[2]]
+
+    def samples(self, labels, value):
+        counts, total, count = value
+        bounds = list(zip(self.buckets, counts)) + [('+Inf', count)]
+        lines = ['{}_bucket{} {}'.format(self.name, format_labels(labels + [('le', bound)]), n)
+                 for bound, n in bounds]
+        lines.append('{}_sum{} {}'.format(self.name, format_labels(labels), total))
+        lines.append('{}_count{} {}'.format(self.name, format_labels(labels), count))
+        return lines
+
+
+class Registry(object):
+    # Gunicorn and Celery run several processes that each record their own
+    # values. With NOVA_METRICS_DIR every process writes its values to a file
+    # there and whichever process is scraped adds up those of all the others.
+    def __init__(self):
+        self.metrics = []
+        self.role = 'web'
+        self.lock = threading.Lock()
+        self.pid = None
+        self.filename = None
+        self.timer = None
+        self.dumped = 0
+
+    def add(self, metric):
+        metric.registry = self
+        self.metrics.append(metric)
+        return metric
+
+    def directory(self):
+        path = app.config.get('NOVA_METRICS_DIR')
+        return os.path.join(path, self.role) if path else None
+
+    def forked(self):
+        # timers do not survive a fork and the pid of a dead worker may be
+        # reused, so every process writes a file of its own. Values recorded
+        # before the fork are already in the file of the parent.
+        if self.pid != os.getpid():
+            if self.pid is not None:
+                for metric in self.metrics:
+                    metric.lock = threading.Lock()
+                    metric.values = {}
+
+            self.pid = os.getpid()
+            self.filename = '{}-{}.json'.format(self.pid, int(time.time() * 1000))
+            self.lock = threading.Lock()
+            self.timer = None
+            self.dumped = 0
+
+    def changed(self):
+        if self.directory() is None:
+            return
+
+        self.forked()
+
+        # at most one write per DUMP_INTERVAL instead of one per request
+        with self.lock:
+            if self.timer is not None:
+                return
+
+            self.timer = threading.Timer(max(self.dumped + DUMP_INTERVAL - time.time(), 0), self.dump)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def dump(self):
+        directory = self.directory()
+
+        if directory is None:
+            return
+
+        self.forked()
+
+        with self.lock:
+            self.timer = None
+            self.dumped = time.time()
+
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        filename = os.path.join(directory, self.filename)
+
+        with open(filename + '.tmp', 'w') as f:
+            json.dump(dict((metric.name, metric.snapshot()) for metric in self.metrics), f)
+
+        os.rename(filename + '.tmp', filename)
+
+    def read(self, filename):
+        try:
+            with open(filename) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def collect(self, directory):
+        """Fold the files of exited processes into EXITED, so that restarted
+        workers neither grow the directory nor slow down scrapes."""
+        def alive(name):
+            try:
+                os.kill(int(name.split('-')[0]), 0)
+            except ValueError:
+                return True
+            except OSError as e:
+                return e.errno == errno.EPERM
+
+            return True
+
+        with open(os.path.join(directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            names = [n for n in os.listdir(directory)
+                     if n.endswith('.json') and n != EXITED and not alive(n)]
+
+            if not names:
+                return
+
+            snapshots = [self.read(os.path.join(directory, n)) or {} for n in [EXITED] + names]
+            exited = dict((metric.name, [[list(key), value] for key, value in
+                                         metric.combine(s.get(metric.name, []) for s in snapshots).items()])
+                          for metric in self.metrics)
+            filename = os.path.join(directory, EXITED)
+
+            with open(filename + '.tmp', 'w') as f:
+                json.dump(exited, f)
+
+            os.rename(filename + '.tmp', filename)
+
+            for name in names:
+                os.unlink(os.path.join(directory, name))
+
+    def load(self):
+        directory = self.directory()
+
+        if directory is None or not os.path.isdir(directory):
+            return []
+
+        self.forked()
+        self.collect(directory)
+        snapshots = []
+
+        for name in os.listdir(directory):
+            if not name.endswith('.json') or name == self.filename:
+                continue
+
+            snapshot = self.read(os.path.join(directory, name))
+
+            if snapshot is not None:
+                snapshots.append(snapshot)
+
+        return snapshots
+
+    def render(self):
+        others = self.load()
+        return '\n'.join(line for metric in self.metrics
+                         for line in metric.render([o.get(metric.name, []) for o in others])) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.add(Histogram('nova_http_request_duration_seconds',
+    "Time spent handling requests", ('endpoint', 'method', 'status')))
+
+request_statements = registry.add(Histogram('nova_http_request_sql_statements',
+    "SQL statements issued per request", ('endpoint', 'method'), COUNT_BUCKETS))
+
+request_sql_duration = registry.add(Histogram('nova_http_request_sql_duration_seconds',
+    "Time spent in SQL statements per request", ('endpoint', 'method')))
+
+sql_statements = registry.add(Counter('nova_sql_statements_total',
+    "SQL statements issued"))
+
+sql_duration = registry.add(Counter('nova_sql_duration_seconds_total',
+    "Time spent in SQL statements"))
+
+elasticsearch_duration = registry.add(Histogram('nova_elasticsearch_request_duration_seconds',
+    "Time spent in Elasticsearch requests", ('method', 'status')))
+
+tar_bytes = registry.add(Counter('nova_tar_bytes_total',
+    "Bytes of dataset archives streamed", ('direction',)))
+
+reclaimed_bytes = registry.add(Counter('nova_gc_reclaimed_bytes_total',
+    "Bytes freed by reclaiming deleted datasets"))
+
+scrubbed_bytes = registry.add(Counter('nova_scrub_bytes_total',
+    "Bytes read to verify checksums of closed datasets"))
+
+damaged_files = registry.add(Counter('nova_scrub_damaged_files_total',
+    "Files found damaged or missing when verifying checksums"))
+
+task_duration = registry.add(Histogram('nova_celery_task_duration_seconds',
+    "Time spent running Celery tasks", ('task', 'state'), TASK_BUCKETS))
+
+
+def endpoint_name():
+    # flask-restful resources are named by their class, views by function
+    view = app.view_functions.get(request.endpoint)
+    resource = getattr(view, 'view_class', None)
+
+    if resource is not None:
+        return resource.__name__
+
+    return request.endpoint or 'unknown'
+
+
+def start_request():
+    g.metrics_start = time.time()
+    g.metrics_statements = 0
+    g.metrics_sql_duration = 0.0
+
+
+def finish_request(response):
+    if 'metrics_start' not in g:
+        return response
+
+    endpoint = endpoint_name()
+    request_duration.observe(time.time() - g.metrics_start, endpoint=endpoint,
+                             method=request.method, status=response.status_code)
+    request_statements.observe(g.metrics_statements, endpoint=endpoint, method=request.method)
+    request_sql_duration.observe(g.metrics_sql_duration, endpoint=endpoint, method=request.method)
+    return response
+
+
+def init_app(app):
+    app.before_request(start_request)
+    app.after_request(finish_request)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault('metrics_start', []).append(time.time())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def finish_statement(connection, cursor, statement, parameters, context, executemany):
+    elapsed = time.time() - connection.info['metrics_start'].pop()
+    sql_statements.inc()
+    sql_duration.inc(elapsed)
+
+    if has_request_context() and 'metrics_statements' in g:
+        g.metrics_statements += 1
+        g.metrics_sql_duration += elapsed
+
+
+def instrument_elasticsearch(client):
+    perform_request = client.transport.perform_request
+
+    def timed_request(method, url, *args, **kwargs):
+        start = time.time()
+        status = 'ok'
+
+        try:
+            return perform_request(method, url, *args, **kwargs)
+        except Exception as e:
+            status = getattr(e, 'status_code', None) or 'error'
+            raise
+        finally:
+            elasticsearch_duration.observe(time.time() - start, method=method, status=status)
+
+    client.transport.perform_request = timed_request
+    return client
+
+
+@signals.task_prerun.connect
+def start_task(task_id=None, task=None, **kwargs):
+    task.request.metrics_start = time.time()
+
+
+@signals.task_postrun.connect
+def finish_task(task_id=None, task=None, state=None, **kwargs):
+    start = getattr(task.request, 'metrics_start', None)
+
+    if start is not None:
+        task_duration.observe(time.time() - start, task=task.name, state=state)
+
+        # pool processes may be replaced right after a task
+        registry.dump()
+
+
+@signals.worker_init.connect
+def use_worker_metrics(**kwargs):
+    # inherited by the pool processes, keeps task metrics apart from those of
+    # the web workers
+    registry.role = 'celery'
+
+
+class Server(object):
+    # Celery workers do not serve HTTP, expose their metrics on a separate port.
+    # This runs in the main worker process, tasks run in the pool processes.
+    def __init__(self, port):
+        self.port = port
+        self.thread = None
+
+    def app(self, environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain; version=0.0.4')])
+        return [registry.render()]
+
+    def start(self):
+        from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        server = make_server('', self.port, self.app, handler_class=QuietHandler)
+        self.thread = threading.Thread(target=server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+
+@signals.worker_ready.connect
+def serve_worker_metrics(**kwargs):
+    port = app.config['NOVA_CELERY_METRICS_PORT']
+
+    if port:
+        Server(port).start()
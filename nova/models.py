@@ -1,4 +1,5 @@
 import os
+import json
 import datetime
 import hashlib
 from nova import app, db
@@ -19,14 +20,16 @@ class User(db.Model):
     fullname = db.Column(db.String)
     is_admin = db.Column(db.Boolean, default=False)
     password = db.Column(PasswordType(
-        schemes=['pbkdf2_sha512'],
-        pbkdf2_sha512__default_rounds=50000,
-        pbkdf2_sha512__salt_size=16),
+        schemes=app.config['NOVA_PASSWORD_SCHEMES'],
+        deprecated='auto',
+        **app.config['NOVA_PASSWORD_OPTIONS']),
         nullable=False)
     token = db.Column(db.String)
     token_time = db.Column(db.DateTime)
     gravatar = db.Column(db.String)
     first_time = db.Column(db.Boolean, default=True)
+    usage = db.Column(db.BigInteger, default=0, nullable=False)
+    quota = db.Column(db.BigInteger)
 
     def __init__(self, name=None, fullname=None, email=None, password=None, is_admin=False):
         self.name = name
@@ -40,21 +43,29 @@ class User(db.Model):
         return '<User(name={}, fullname={}>'.format(self.name, self.fullname)
 
     def get_signer(self):
+        # not derived from the password hash, which changes when it is rehashed
+        return Signer(app.secret_key + self.token_time.isoformat())
+
+    def get_legacy_signer(self):
         return Signer(self.password.hash + self.token_time.isoformat())
 
+    def signs_token(self, signer, token):
+        try:
+            return str(self.id) == signer.unsign(token)
+        except BadSignature:
+            return False
+
     def generate_token(self):
         self.token_time = datetime.datetime.utcnow()
         self.token = self.get_signer().sign(str(self.id))
         db.session.commit()
 
     def is_token_valid(self, token):
-        try:
-            if str(self.id) != self.get_signer().unsign(token):
-                return False
-        except BadSignature:
+        if self.token is None or self.token != token:
             return False
 
-        return True
+        return self.signs_token(self.get_signer(), token) or \
+            self.signs_token(self.get_legacy_signer(), token)
 
     def is_authenticated(self):
         return True
@@ -79,6 +90,8 @@ class Collection(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     description = db.Column(db.String)
+    usage = db.Column(db.BigInteger, default=0, nullable=False)
+    quota = db.Column(db.BigInteger)
 
     datasets = db.relationship('Dataset', cascade='all, delete, delete-orphan')
 
@@ -94,8 +107,14 @@ class Group(db.Model):
 
     memberships = db.relationship('Membership', cascade='all, delete, delete-orphan')
 
+    def to_dict(self):
+        return dict(id=self.id, name=self.name, description=self.description)
+
 class Membership(db.Model):
     __tablename__ = 'memberships'
+    __table_args__ = (
+        db.Index('ix_memberships_group_id', 'group_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -109,6 +128,10 @@ class Membership(db.Model):
 class Dataset(db.Model):
 
     __tablename__ = 'datasets'
+    __table_args__ = (
+        db.Index('ix_datasets_name', 'name'),
+        db.Index('ix_datasets_collection_id', 'collection_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(50))
@@ -120,6 +143,13 @@ class Dataset(db.Model):
     closed = db.Column(db.Boolean, default=False)
     collection_id = db.Column(db.Integer, db.ForeignKey('collections.id'))
     has_thumbnail = db.Column(db.Boolean, default=False)
+    review_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)
+    version = db.Column(db.Integer, default=1, nullable=False)
+    file_count = db.Column(db.Integer)
+    size = db.Column(db.BigInteger)
+    verified = db.Column(db.DateTime)
+    damaged = db.Column(db.Integer)
 
     collection = db.relationship('Collection', back_populates='datasets')
     accesses = db.relationship('Access', cascade='all, delete, delete-orphan')
@@ -130,9 +160,25 @@ class Dataset(db.Model):
         'polymorphic_on': type
     }
 
-    def to_dict(self):
-        path = os.path.join(app.config['NOVA_ROOT_PATH'], self.path)
-        return dict(name=self.name, path=path, closed=self.closed, description=self.description)
+    fields = ('id', 'name', 'path', 'closed', 'description', 'created',
+              'review_count', 'rating', 'file_count', 'size')
+
+    @property
+    def rating(self):
+        return self.rating_sum / float(self.review_count) if self.review_count else 0
+
+    def to_dict(self, fields=('name', 'path', 'closed', 'description')):
+        result = {}
+
+        for field in fields:
+            if field == 'path':
+                result['path'] = os.path.join(app.config['NOVA_ROOT_PATH'], self.path)
+            elif field == 'created':
+                result['created'] = self.created.isoformat() if self.created else None
+            else:
+                result[field] = getattr(self, field)
+
+        return result
 
     def __repr__(self):
         return '<Dataset(name={}, path={}>'.format(self.name, self.path)
@@ -154,7 +200,7 @@ class Order(db.Model):
     __tablename__ = 'orders'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    name = db.Column(db.String, unique=True, index=True)
 
     def __repr__(self):
         return '<Order(name={}>'.format(self.name)
@@ -165,7 +211,7 @@ class Family(db.Model):
     __tablename__ = 'families'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    name = db.Column(db.String, unique=True, index=True)
 
     def __repr__(self):
         return '<Family(name={}>'.format(self.name)
@@ -176,7 +222,7 @@ class Genus(db.Model):
     __tablename__ = 'genuses'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    name = db.Column(db.String, unique=True, index=True)
 
     def __repr__(self):
         return '<Genus(name={}>'.format(self.name)
@@ -219,6 +265,10 @@ class Volume(Dataset):
 class Permission(db.Model):
 
     __tablename__ = 'permissions'
+    __table_args__ = (
+        db.Index('ix_permissions_dataset_id', 'dataset_id'),
+        db.Index('ix_permissions_owner_id_dataset_id', 'owner_id', 'dataset_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     owner_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -259,6 +309,9 @@ class Access(db.Model):
 class Notification(db.Model):
 
     __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('ix_notifications_user_id', 'user_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     message = db.Column(db.String)
@@ -282,6 +335,10 @@ class Notification(db.Model):
 class Process(db.Model):
 
     __tablename__ = 'processes'
+    __table_args__ = (
+        db.Index('ix_processes_source_id', 'source_id'),
+        db.Index('ix_processes_destination_id', 'destination_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(50))
@@ -335,6 +392,10 @@ class Derivation(Process):
 class Bookmark(db.Model):
 
     __tablename__ = 'bookmarks'
+    __table_args__ = (
+        db.Index('ix_bookmarks_user_id_dataset_id', 'user_id', 'dataset_id'),
+        db.Index('ix_bookmarks_dataset_id', 'dataset_id'),
+    )
 
     id = db.Column(db.Integer,  primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -357,6 +418,9 @@ class Bookmark(db.Model):
 class Review(db.Model):
 
     __tablename__ = 'reviews'
+    __table_args__ = (
+        db.Index('ix_reviews_dataset_id_user_id', 'dataset_id', 'user_id'),
+    )
 
     id = db.Column(db.Integer,  primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -381,6 +445,10 @@ class Review(db.Model):
 class Connection(db.Model):
 
     __tablename__ = 'connections'
+    __table_args__ = (
+        db.Index('ix_connections_from_id_to_id', 'from_id', 'to_id'),
+        db.Index('ix_connections_to_id', 'to_id'),
+    )
 
     id = db.Column(db.Integer,  primary_key=True)
     from_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -402,6 +470,9 @@ class Connection(db.Model):
 
 class AccessRequest(db.Model):
     __tablename__ = 'access_requests'
+    __table_args__ = (
+        db.Index('ix_access_requests_dataset_id', 'dataset_id'),
+    )
 
     id = db.Column(db.Integer,  primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -424,6 +495,9 @@ class AccessRequest(db.Model):
 
 class DirectAccess(db.Model):
     __tablename__ = 'direct_access'
+    __table_args__ = (
+        db.Index('ix_direct_access_dataset_id_user_id', 'dataset_id', 'user_id'),
+    )
 
     id = db.Column(db.Integer,  primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -441,3 +515,92 @@ class DirectAccess(db.Model):
     def __repr__(self):
         return '<DirectAccess(user={}, dataset={}, read={}, interact={}, fork={}>'.\
             format(self.user, object, self.dataset, self.can_interact, self.can_fork)
+
+
+class EffectivePermission(db.Model):
+    __tablename__ = 'effective_permissions'
+    __table_args__ = (
+        db.Index('ix_effective_permissions_dataset_id_user_id', 'dataset_id', 'user_id'),
+        db.Index('ix_effective_permissions_user_id_dataset_id', 'user_id', 'dataset_id'),
+    )
+
+    id = db.Column(db.Integer,  primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    can_read = db.Column(db.Boolean, default=False)
+    can_interact = db.Column(db.Boolean, default=False)
+    can_fork = db.Column(db.Boolean, default=False)
+
+    def __repr__(self):
+        return '<EffectivePermission(user={}, dataset={}, read={}, interact={}, fork={}>'.\
+            format(self.user_id, self.dataset_id, self.can_read, self.can_interact, self.can_fork)
+
+
+class Service(db.Model):
+    __tablename__ = 'services'
+
+    id = db.Column(db.Integer,  primary_key=True)
+    name = db.Column(db.String, unique=True, nullable=False)
+    url = db.Column(db.String)
+    secret = db.Column(db.String)
+    registered = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    last_seen = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return '<Service(name={}, url={})>'.format(self.name, self.url)
+
+    def to_dict(self):
+        return dict(name=self.name, url=self.url)
+
+
+class TaxonomyImport(db.Model):
+    __tablename__ = 'taxonomy_imports'
+
+    id = db.Column(db.Integer,  primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    filename = db.Column(db.String)
+    path = db.Column(db.String)
+    status = db.Column(db.String, default='pending')
+    size = db.Column(db.Integer, default=0)
+    position = db.Column(db.Integer, default=0)
+    rows = db.Column(db.Integer, default=0)
+    updated = db.Column(db.Integer, default=0)
+    errors = db.Column(db.Text, default='[]')
+    created = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    finished = db.Column(db.DateTime)
+
+    user = db.relationship('User')
+
+    def __repr__(self):
+        return '<TaxonomyImport(filename={}, status={})>'.format(self.filename, self.status)
+
+    def to_dict(self):
+        progress = float(self.position) / self.size if self.size else 1.0
+        return dict(id=self.id, filename=self.filename, status=self.status,
+                    rows=self.rows, updated=self.updated, progress=progress,
+                    errors=json.loads(self.errors or '[]'), created=self.created.isoformat(),
+                    finished=self.finished.isoformat() if self.finished else None)
+
+
+class Tombstone(db.Model):
+    __tablename__ = 'tombstones'
+    __table_args__ = (
+        db.Index('ix_tombstones_status', 'status'),
+    )
+
+    id = db.Column(db.Integer,  primary_key=True)
+    dataset_id = db.Column(db.Integer)
+    name = db.Column(db.String)
+    path = db.Column(db.String)
+    status = db.Column(db.String, default='pending')
+    files = db.Column(db.Integer, default=0)
+    size = db.Column(db.BigInteger, default=0)
+    created = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    started = db.Column(db.DateTime)
+    reclaimed = db.Column(db.DateTime)
+    checks = db.Column(db.Integer, default=0)
+    retry = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return '<Tombstone(path={}, status={})>'.format(self.path, self.status)
+
@@ -0,0 +1,182 @@
+import json
+import time
+import atexit
+import threading
+from collections import OrderedDict, deque
+from Queue import Queue, Empty, Full
+from nova import app, db, models
+
+
+class Broker(object):
+    # Subscribers are plain queues, which become cooperative under gevent, so
+    # an idle stream costs one blocked greenlet.
+
+    def __init__(self, size=100):
+        self.size = size
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        queue = Queue(maxsize=self.size)
+
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(queue)
+
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self.lock:
+            queues = self.subscribers.get(user_id, set())
+            queues.discard(queue)
+
+            if not queues:
+                self.subscribers.pop(user_id, None)
+
+    def publish(self, user_id, payload):
+        with self.lock:
+            queues = list(self.subscribers.get(user_id, ()))
+
+        for queue in queues:
+            try:
+                queue.put_nowait(payload)
+            except Full:
+                # slow consumers catch up with Last-Event-ID on reconnect
+                pass
+
+
+class Pipeline(object):
+    # Events for the same recipient, type and subject that arrive within the
+    # window are merged into one notification, and all notifications that
+    # are due are written with a single commit by a background thread.
+
+    def __init__(self, window=10):
+        self.window = window
+        self.pending = OrderedDict()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def enqueue(self, user_id, type, subject, actor, message):
+        key = (user_id, type, subject, message)
+
+        with self.lock:
+            if key not in self.pending:
+                self.pending[key] = dict(actors=[], created=time.time())
+
+            actors = self.pending[key]['actors']
+
+            if actor not in actors:
+                actors.append(actor)
+
+            # started lazily so that forked workers get their own thread
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run)
+                self.thread.daemon = True
+                self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(max(self.window / 2.0, 0.1))
+
+            try:
+                self.flush()
+            except Exception:
+                app.logger.exception("Could not write notifications")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+    def flush(self, force=False):
+        deadline = time.time() - self.window
+
+        with self.lock:
+            due = [k for k, e in self.pending.items() if force or e['created'] <= deadline]
+            events = [(k, self.pending.pop(k)) for k in due]
+
+        if not events:
+            return
+
+        ids = set(k[0] for k, _ in events)
+        recipients = dict((u.id, u) for u in
+                          db.session.query(models.User).filter(models.User.id.in_(ids)))
+        notifications = []
+
+        for (user_id, type, subject, message), event in events:
+            actors = event['actors']
+            actors = actors[0] if len(actors) == 1 else '{} users'.format(len(actors))
+            message = message.format(actors=actors, subject=subject)
+            notifications.append(models.Notification(recipients[user_id], type=type, message=message))
+
+        db.session.add_all(notifications)
+        db.session.commit()
+
+        for notification in notifications:
+            publish(notification)
+
+
+class RateLimit(object):
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.calls = {}
+        self.swept = time.time()
+        self.lock = threading.Lock()
+
+    def allow(self, key):
+        now = time.time()
+
+        with self.lock:
+            # drop keys without calls in the period, once per period
+            if now - self.swept >= self.period:
+                for k in [k for k, c in self.calls.items() if not c or c[-1] <= now - self.period]:
+                    del self.calls[k]
+
+                self.swept = now
+
+            calls = self.calls.setdefault(key, deque())
+
+            while calls and calls[0] <= now - self.period:
+                calls.popleft()
+
+            if len(calls) >= self.limit:
+                return False
+
+            calls.append(now)
+            return True
+
+
+broker = Broker()
+
+pipeline = Pipeline(app.config['NOVA_NOTIFICATION_WINDOW'])
+
+bookmark_limit = RateLimit(*app.config['NOVA_BOOKMARK_RATE_LIMIT'])
+
+
+@atexit.register
+def flush_pending():
+    pipeline.flush(force=True)
+
+
+def publish(notification):
+    broker.publish(notification.user_id, notification.to_dict())
+
+
+def enqueue(user, type, subject, actor, message):
+    pipeline.enqueue(user.id, type, subject, actor, message)
+
+
+def format_event(payload):
+    return 'id: {}\ndata: {}\n\n'.format(payload['id'], json.dumps(payload))
+
+
+def stream(queue, user_id, pending, keepalive=30):
+    try:
+        for payload in pending:
+            yield format_event(payload)
+
+        while True:
+            try:
+                yield format_event(queue.get(timeout=keepalive))
+            except Empty:
+                yield ': keepalive\n\n'
+    finally:
+        broker.unsubscribe(user_id, queue)
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import random
+import datetime
+import threading
+from functools import wraps
+from flask import g, request, current_app, has_request_context
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+class Sampler(object):
+    # Statistical profiler: a thread looks at the stack of the profiled
+    # thread every `interval' seconds. Cheap enough to leave on for single
+    # requests and independent of any C extension.
+    def __init__(self, interval):
+        self.interval = interval
+        self.ident = threading.current_thread().ident
+        self.frames = []
+        self.indices = {}
+        self.samples = []
+        self.events = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    def frame_index(self, code):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+
+        if key not in self.indices:
+            self.indices[key] = len(self.frames)
+            self.frames.append(dict(name=code.co_name, file=code.co_filename,
+                                    line=code.co_firstlineno))
+
+        return self.indices[key]
+
+    def run(self):
+        last = time.time()
+
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.ident)
+            stack = []
+
+            while frame is not None:
+                stack.append(self.frame_index(frame.f_code))
+                frame = frame.f_back
+
+            now = time.time()
+            self.samples.append((list(reversed(stack)), now - last))
+            last = now
+
+    def start(self):
+        self.start_time = time.time()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.end_time = time.time()
+
+    def record(self, kind, name, start, end):
+        self.events.append((kind, name, start - self.start_time, end - self.start_time))
+
+    def summary(self):
+        totals = {}
+
+        for kind, _, start, end in self.events:
+            count, elapsed = totals.get(kind, (0, 0.0))
+            totals[kind] = (count + 1, elapsed + end - start)
+
+        return totals
+
+    def speedscope(self, name):
+        duration = self.end_time - self.start_time
+        frames = list(self.frames)
+        profiles = [dict(type='sampled', name=name, unit='seconds', startValue=0,
+                         endValue=duration,
+                         samples=[stack for stack, _ in self.samples],
+                         weights=[weight for _, weight in self.samples])]
+
+        # SQL and filesystem calls as their own timeline, nested calls must
+        # open after and close before their parents
+        timeline = []
+
+        for kind, label, start, end in self.events:
+            frames.append(dict(name='{}: {}'.format(kind, label[:200])))
+            timeline.append(((start, 1, -end), dict(type='O', frame=len(frames) - 1, at=start)))
+            timeline.append(((end, 0, -start), dict(type='C', frame=len(frames) - 1, at=end)))
+
+        profiles.append(dict(type='evented', name='SQL and filesystem', unit='seconds',
+                             startValue=0, endValue=duration,
+                             events=[e for _, e in sorted(timeline)]))
+
+        return {'$schema': SCHEMA, 'name': name, 'shared': {'frames': frames},
+                'profiles': profiles, 'exporter': 'nova'}
+
+
+def current_sampler():
+    if has_request_context():
+        return g.get('profiler')
+
+
+def is_admin():
+    if current_user.is_authenticated and current_user.is_admin:
+        return True
+
+    from nova import users
+
+    token = request.headers.get('Auth-Token')
+
+    if token:
+        user = users.check_token(token)
+        return user is not None and user.is_admin
+
+    return False
+
+
+def requested():
+    return request.headers.get('X-Nova-Profile') or request.args.get('profile')
+
+
+def start_request():
+    rate = current_app.config['NOVA_PROFILE_SAMPLE_RATE']
+
+    if (requested() and is_admin()) or (rate and random.random() < rate):
+        g.profiler = Sampler(current_app.config['NOVA_PROFILE_INTERVAL'])
+        g.profiler.start()
+
+
+def finish_request(exception=None):
+    # a teardown handler, after_request is skipped when the view raises and
+    # would leave the sampler running
+    sampler = current_sampler()
+
+    if sampler is None:
+        return
+
+    sampler.stop()
+    g.profiler = None
+
+    summary = sampler.summary()
+    duration = sampler.end_time - sampler.start_time
+    name = '{} {} ({:.0f} ms, {} SQL statements in {:.0f} ms, {} filesystem calls in {:.0f} ms)'.\
+        format(request.method, request.full_path.rstrip('?'), duration * 1000,
+               summary.get('sql', (0, 0))[0], summary.get('sql', (0, 0))[1] * 1000,
+               summary.get('fs', (0, 0))[0], summary.get('fs', (0, 0))[1] * 1000)
+
+    profiles.save(sampler.speedscope(name), request.endpoint, duration)
+
+
+class Profiles(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    @property
+    def path(self):
+        return os.path.join(os.path.abspath(current_app.config['NOVA_ROOT_PATH']), '.profiles')
+
+    def save(self, profile, endpoint, duration):
+        filename = '{}-{}-{:.0f}ms.speedscope.json'.format(
+            datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f'), endpoint or 'unknown',
+            duration * 1000)
+
+        with self.lock:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+
+            with open(os.path.join(self.path, filename), 'w') as f:
+                json.dump(profile, f)
+
+            for old in self.list()[current_app.config['NOVA_PROFILE_KEEP']:]:
+                os.unlink(os.path.join(self.path, old))
+
+    def list(self):
+        if not os.path.exists(self.path):
+            return []
+
+        names = [n for n in os.listdir(self.path) if n.endswith('.speedscope.json')]
+        return sorted(names, reverse=True)
+
+
+profiles = Profiles()
+
+
+def timed(kind):
+    """Record calls of the decorated function in the profile of the request."""
+    def wrapper(func):
+        @wraps(func)
+        def decorated(*args, **kwargs):
+            sampler = current_sampler()
+
+            if sampler is None:
+                return func(*args, **kwargs)
+
+            start = time.time()
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                sampler.record(kind, func.__name__, start, time.time())
+
+        return decorated
+    return wrapper
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement(connection, cursor, statement, parameters, context, executemany):
+    if current_sampler() is not None:
+        connection.info.setdefault('profiler_start', []).append(time.time())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def finish_statement(connection, cursor, statement, parameters, context, executemany):
+    sampler = current_sampler()
+
+    if sampler is not None and connection.info.get('profiler_start'):
+        sampler.record('sql', statement, connection.info['profiler_start'].pop(), time.time())
+
+
+def init_app(app):
+    app.before_request(start_request)
+    app.teardown_request(finish_request)
@@ -0,0 +1,159 @@
+import os
+from sqlalchemy import func
+from nova import app, db, models, caching
+
+
+class QuotaExceeded(Exception):
+
+    pass
+
+
+def limit(quota, default):
+    return quota if quota is not None else app.config[default]
+
+
+def available(user_id, collection_id):
+    """Return the bytes user_id may still add to collection_id or None if no
+    quota applies. Reads the two counter rows only, never the filesystem."""
+    usage, quota = db.session.query(models.User.usage, models.User.quota).\
+        filter(models.User.id == user_id).one()
+    remaining = []
+    quota = limit(quota, 'NOVA_USER_QUOTA')
+
+    if quota is not None:
+        remaining.append(quota - usage)
+
+    if collection_id is not None:
+        usage, quota = db.session.query(models.Collection.usage, models.Collection.quota).\
+            filter(models.Collection.id == collection_id).one()
+        quota = limit(quota, 'NOVA_COLLECTION_QUOTA')
+
+        if quota is not None:
+            remaining.append(quota - usage)
+
+    return max(min(remaining), 0) if remaining else None
+
+
+def admit(dataset, size):
+    """Raise QuotaExceeded if adding size bytes to dataset is over quota."""
+    owner_id = dataset.permissions.owner_id if dataset.permissions else None
+
+    if owner_id is None:
+        return
+
+    remaining = available(owner_id, dataset.collection_id)
+
+    if remaining is not None and size > remaining:
+        raise QuotaExceeded("{} bytes exceed the remaining quota of {} bytes".format(size, remaining))
+
+
+def add(obj, size, default=None):
+    # one UPDATE per charge, assigning `usage + size' to the attribute would
+    # let a second charge before the flush replace the first
+    if obj.id is None:
+        obj.usage = (obj.usage or 0) + size
+        return
+
+    table = type(obj).__table__
+    statement = table.update().where(table.c.id == obj.id)
+
+    # checked by the database in the same statement, so that concurrent
+    # charges cannot both fit into the space that is left
+    if default is not None and size > 0:
+        if app.config[default] is None:
+            statement = statement.where(db.or_(table.c.quota.is_(None), table.c.usage + size <= table.c.quota))
+        else:
+            statement = statement.where(table.c.usage + size <= func.coalesce(table.c.quota, app.config[default]))
+
+    result = db.session.execute(statement.values(usage=table.c.usage + size))
+
+    if result.rowcount == 0:
+        raise QuotaExceeded("{} bytes exceed the remaining quota".format(size))
+
+    db.session.expire(obj, ['usage'])
+    caching.touch(table.name)
+
+
+def charge(dataset, size, files=0, enforce=False):
+    """Account size bytes and files to dataset, its owner and its collection.
+    Negative values release space, the caller commits. With enforce raise
+    QuotaExceeded if that exceeds a quota, the caller rolls back then."""
+    if not size and not files:
+        return
+
+    if dataset.id is None:
+        dataset.size = (dataset.size or 0) + size
+        dataset.file_count = (dataset.file_count or 0) + files
+    else:
+        datasets = models.Dataset.__table__
+        db.session.execute(datasets.update().where(datasets.c.id == dataset.id).values(
+            size=func.coalesce(datasets.c.size, 0) + size,
+            file_count=func.coalesce(datasets.c.file_count, 0) + files,
+            version=datasets.c.version + 1))
+        db.session.expire(dataset, ['size', 'file_count', 'version'])
+        caching.touch('datasets')
+
+    if dataset.permissions is not None and dataset.permissions.owner is not None:
+        add(dataset.permissions.owner, size, 'NOVA_USER_QUOTA' if enforce else None)
+
+    if dataset.collection is not None:
+        add(dataset.collection, size, 'NOVA_COLLECTION_QUOTA' if enforce else None)
+
+
+def measure(path):
+    files, size = 0, 0
+
+    for root, dirs, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+                files += 1
+            except OSError:
+                pass
+
+    return files, size
+
+
+def usage(user):
+    """Usage and quota of user and of the collections it owns datasets in."""
+    used, quota = db.session.query(models.User.usage, models.User.quota).\
+        filter(models.User.id == user.id).one()
+    quota = limit(quota, 'NOVA_USER_QUOTA')
+
+    collections = db.session.query(models.Collection).\
+        filter(models.Collection.id.in_(
+            db.session.query(models.Dataset.collection_id).join(models.Permission).
+            filter(models.Permission.owner_id == user.id)))
+
+    return dict(used=used, quota=quota,
+                available=max(quota - used, 0) if quota is not None else None,
+                collections=[dict(name=c.name, used=c.usage,
+                                  quota=limit(c.quota, 'NOVA_COLLECTION_QUOTA'))
+                             for c in collections.order_by(models.Collection.name)])
+
+
+def recount():
+    """Measure every dataset and recompute all counters from scratch, e.g.
+    after data was changed outside of nova or when enabling quotas."""
+    users, collections = {}, {}
+    rows = db.session.query(models.Dataset.id, models.Dataset.path, models.Dataset.collection_id,
+                            models.Permission.owner_id).\
+        outerjoin(models.Permission, models.Permission.dataset_id == models.Dataset.id)
+
+    for dataset_id, path, collection_id, owner_id in rows.all():
+        files, size = measure(path) if path else (0, 0)
+        models.Dataset.query.filter(models.Dataset.id == dataset_id).\
+            update(dict(file_count=files, size=size), synchronize_session=False)
+        users[owner_id] = users.get(owner_id, 0) + size
+        collections[collection_id] = collections.get(collection_id, 0) + size
+
+    models.User.query.update(dict(usage=0), synchronize_session=False)
+    models.Collection.query.update(dict(usage=0), synchronize_session=False)
+
+    for model, counters in ((models.User, users), (models.Collection, collections)):
+        for key, size in counters.items():
+            if key is not None:
+                model.query.filter(model.id == key).update(dict(usage=size), synchronize_session=False)
+
+    db.session.commit()
+    caching.invalidate('datasets', 'users', 'collections')
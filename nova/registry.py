@@ -0,0 +1,97 @@
+import time
+import hashlib
+import datetime
+import threading
+from nova import app, db, models
+
+
+def hash_secret(secret):
+    return hashlib.sha256(secret).hexdigest()
+
+
+class ServiceRegistry(object):
+    # Registrations live in the database so that every worker sees the same
+    # services. Each worker keeps a copy that it reloads after `refresh`
+    # seconds, which keeps lookups plain dictionary hits.
+
+    def __init__(self, refresh=10, ttl=300):
+        self.refresh = refresh
+        self.ttl = ttl
+        self.services = {}
+        self.loaded = 0
+        self.lock = threading.Lock()
+
+    def deadline(self):
+        return datetime.datetime.utcnow() - datetime.timedelta(seconds=self.ttl)
+
+    def load(self):
+        services = dict((s.name, s.to_dict()) for s in
+                        db.session.query(models.Service).\
+                        filter(models.Service.last_seen >= self.deadline()))
+
+        with self.lock:
+            self.services = services
+            self.loaded = time.time()
+
+    def current(self):
+        if time.time() - self.loaded > self.refresh:
+            self.load()
+
+        return self.services
+
+    def invalidate(self):
+        self.loaded = 0
+
+    def get(self, name, default=None):
+        return self.current().get(name, default)
+
+    def values(self):
+        return self.current().values()
+
+    def __contains__(self, name):
+        return name in self.current()
+
+    def register(self, name, url, secret):
+        service = db.session.query(models.Service).\
+            filter(models.Service.name == name).\
+            first()
+
+        if service is None:
+            service = models.Service(name=name, secret=hash_secret(secret))
+            db.session.add(service)
+        elif service.secret != hash_secret(secret):
+            return False
+
+        service.url = url
+        service.last_seen = datetime.datetime.utcnow()
+        db.session.commit()
+        self.invalidate()
+        return True
+
+    def deregister(self, name, secret):
+        service = db.session.query(models.Service).\
+            filter(models.Service.name == name).\
+            first()
+
+        if service is None or service.secret != hash_secret(secret):
+            return False
+
+        db.session.delete(service)
+        db.session.commit()
+        self.invalidate()
+        return True
+
+    def expire(self):
+        db.session.query(models.Service).\
+            filter(models.Service.last_seen < self.deadline()).\
+            delete(synchronize_session=False)
+        db.session.commit()
+
+    def touch(self, name):
+        db.session.query(models.Service).\
+            filter(models.Service.name == name).\
+            update({'last_seen': datetime.datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+
+
+services = ServiceRegistry(app.config['NOVA_SERVICE_REFRESH'], app.config['NOVA_SERVICE_TTL'])
@@ -1,16 +1,19 @@
-import io
+import json
 import math
+import tarfile
 import datetime
 from functools import wraps
 from flask import request, url_for, Response
+from flask_login import current_user
 from flask_restful import Resource, abort, reqparse
 from itsdangerous import Signer, BadSignature
-from nova import db, models, logic, es, users, memtar, fs, search
-from sqlalchemy import desc, func, not_
+from nova import (app, db, models, logic, es, users, memtar, fs, search, access, notify,
+        registry, caching, metrics, taxonomy, tasks, quota, checksums)
+from sqlalchemy import desc, func, not_, or_, and_
+from sqlalchemy.orm import load_only
 
 
-# TODO: serialize this in the DB?
-services = {}
+services = registry.services
 
 
 def authenticate(func):
@@ -30,7 +33,8 @@ def authenticate(func):
 
 def get_dataset_owner(dataset):
     return db.session.query(models.User).\
-        filter(models.Dataset.id == dataset.id).\
+        join(models.Permission, models.Permission.owner_id == models.User.id).\
+        filter(models.Permission.dataset_id == dataset.id).\
         first()
 
 
@@ -42,11 +46,10 @@ class Services(Resource):
         parser.add_argument('secret', type=str, required=True)
         args = parser.parse_args()
 
-        if args.name in services:
+        # registering again with the same secret acts as a heartbeat
+        if not services.register(args.name, args.url, args.secret):
             abort(400, error="Service `{}' already exists".format(args.name))
 
-        services[args.name] = dict(name=args.name, url=args.url)
-
     def get(self):
         return services.values()
 
@@ -58,11 +61,9 @@ class Service(Resource):
 
         args = parser.parse_args()
 
-        if not name in services:
+        if not services.deregister(name, args.secret):
             abort(400, error="Service `{}' is not registered".format(name))
 
-        del services[name]
-
 
 class Groups(Resource):
     method_decorators = [authenticate]
@@ -74,7 +75,7 @@ class Groups(Resource):
         if args.filter is 'me':
             query = query.join(models.Membership).\
             filter(models.Membership.user == user)
-        return [g.to_dict() for g in query.all()]
+        return caching.conditional([g.to_dict() for g in query.all()])
 
     def post(self, user=None):
         payload = request.get_json()
@@ -109,14 +110,48 @@ class Datasets(Resource):
     method_decorators = [authenticate]
 
     def get(self, user=None):
-        return [d.to_dict() for d in
-                    db.session.query(models.Dataset).\
-                    filter(models.Permission.can_read).\
-                    all()]
+        parser = reqparse.RequestParser()
+        parser.add_argument('after', type=int, default=0)
+        parser.add_argument('limit', type=int, default=app.config['NOVA_API_PAGE_SIZE'])
+        parser.add_argument('fields', type=str)
+        args = parser.parse_args()
+
+        limit = max(1, min(args.limit, app.config['NOVA_API_MAX_PAGE_SIZE']))
+        fields = args.fields.split(',') if args.fields else \
+            ['name', 'path', 'closed', 'description', 'review_count', 'rating']
+        unknown = set(fields) - set(models.Dataset.fields)
+
+        if unknown:
+            abort(400, error="Unknown fields: {}".format(', '.join(sorted(unknown))))
+
+        # keyset pagination on the primary key keeps every page an index range
+        # scan, no matter how deep the client has paged
+        columns = set(fields) - set(['rating']) | set(['id', 'type'])
+
+        if 'rating' in fields:
+            columns |= set(['review_count', 'rating_sum'])
+
+        datasets = db.session.query(models.Dataset).\
+            options(load_only(*columns)).\
+            filter(models.Dataset.id > args.after)
+
+        datasets = access.readable(datasets, user).\
+            order_by(models.Dataset.id).\
+            limit(limit).\
+            all()
+
+        headers = {}
+
+        if len(datasets) == limit:
+            url = url_for('datasets', after=datasets[-1].id, limit=limit,
+                          fields=','.join(fields), _external=True)
+            headers['Link'] = '<{}>; rel="next"'.format(url)
+
+        return [d.to_dict(fields) for d in datasets], 200, headers
 
     def post(self, user=None):
         def validate_datetime(x):
-            return datetime.strptime(x, '%Y-%m-%dT%H:%M:%S')
+            return datetime.datetime.strptime(x, '%Y-%m-%dT%H:%M:%S')
 
         parser = reqparse.RequestParser()
         parser.add_argument('name', type=str, help="Dataset name")
@@ -139,9 +174,74 @@ class Datasets(Resource):
         permission = models.Permission(owner=user, dataset=dataset, can_read=True, can_interact=True, can_fork=False)
         db.session.add_all([dataset, permission])
         db.session.commit()
-        search.insert(dataset)
+        search.try_insert(dataset)
         return dict(id=dataset.id), 201
 
+class BulkDatasets(Resource):
+    method_decorators = [authenticate]
+
+    def parse(self, spec):
+        if not isinstance(spec, dict):
+            return "Expected an object"
+
+        for key in ('name', 'collection'):
+            if not isinstance(spec.get(key), basestring) or not spec[key]:
+                return "`{}' is required".format(key)
+
+        if spec.get('created'):
+            try:
+                spec['created'] = datetime.datetime.strptime(spec['created'], '%Y-%m-%dT%H:%M:%S')
+            except (TypeError, ValueError):
+                return "`created' must look like 2017-01-31T12:00:00"
+
+    def post(self, user=None):
+        # either a JSON array or newline delimited JSON, one spec per line
+        if request.mimetype == 'application/x-ndjson':
+            try:
+                specs = [json.loads(line) for line in request.stream if line.strip()]
+            except ValueError:
+                abort(400, error="Invalid JSON line.")
+        else:
+            specs = request.get_json(force=True, silent=True)
+
+            if not isinstance(specs, list):
+                abort(400, error="Expected a JSON array of datasets.")
+
+        if len(specs) > app.config['NOVA_BULK_MAX_DATASETS']:
+            abort(413, error="At most {} datasets per request.".format(app.config['NOVA_BULK_MAX_DATASETS']))
+
+        errors = [self.parse(spec) for spec in specs]
+        valid = [i for i, error in enumerate(errors) if error is None]
+        created = dict(zip(valid, logic.create_datasets(user, [specs[i] for i in valid])))
+        results = []
+        documents = []
+
+        for i, spec in enumerate(specs):
+            name = spec.get('name') if isinstance(spec, dict) else None
+            dataset, error = created.get(i, (None, errors[i]))
+
+            if dataset is None:
+                results.append(dict(name=name, status='error', error=error))
+            else:
+                results.append(dict(name=name, status='created', id=dataset.id, path=dataset.path))
+                documents.append(search.document(dataset, user.name, spec['collection']))
+
+        # the datasets are committed already, a missing index entry is
+        # fixed by the next reindex
+        indexed = False
+
+        if documents and search.health.available is not False:
+            try:
+                search.insert_many(documents)
+                indexed = True
+            except Exception as e:
+                app.logger.warning("Cannot index {} datasets: {}".format(len(documents), e))
+
+        status = 201 if len(documents) == len(specs) else 207
+        return {'created': len(documents), 'failed': len(specs) - len(documents),
+                'indexed': indexed, 'results': results}, status
+
+
 class Dataset(Resource):
     method_decorators = [authenticate]
     def head(self, owner, dataset, user=None):
@@ -162,7 +262,12 @@ class Dataset(Resource):
         if dataset is None:
             abort(404, error="Dataset does not exist for this user")
 
-        return dataset.to_dict()
+        etag = caching.etag_of('dataset', dataset.id, dataset.version)
+
+        if caching.matches(etag):
+            return caching.not_modified(etag)
+
+        return dataset.to_dict(), 200, caching.headers(etag)
 
     def put(self, owner, dataset, user=None):
         if user.name != owner:
@@ -213,20 +318,69 @@ class DeriveDataset(Resource):
 
         derived_dataset = logic.derive_dataset(models.Dataset, dataset, user,
                                                name, permissions=permission_list)
-        search.insert(derived_dataset)
+        search.try_insert(derived_dataset)
         return {'url': url_for('show_dataset', user=user.name, dataset=derived_dataset.name)}, 201
 
+class Lineage(Resource):
+    method_decorators = [authenticate]
+
+    def get(self, owner, dataset, user=None):
+        parser = reqparse.RequestParser()
+        parser.add_argument('direction', choices=('ancestors', 'descendants', 'both'), default='both')
+        parser.add_argument('depth', type=int)
+        args = parser.parse_args()
+
+        dataset = db.session.query(models.Dataset).join(models.Permission).\
+                join(models.User).filter(models.User.name == owner).\
+                filter(models.Dataset.name == dataset).\
+                first()
+
+        if dataset is None:
+            abort(404, error="Dataset does not exist for this user")
+
+        if not access.get_permissions(user, dataset)['read']:
+            abort(403, error="Dataset cannot be read by this user")
+
+        datasets, edges = logic.get_lineage(dataset,
+                                            ancestors=args.direction != 'descendants',
+                                            descendants=args.direction != 'ancestors',
+                                            depth=args.depth)
+
+        readable = set(r[0] for r in
+                       access.readable(db.session.query(models.Dataset.id), user).\
+                       filter(models.Dataset.id.in_([d.id for d in datasets])))
+
+        nodes = []
+
+        for d in datasets:
+            if d.id not in readable:
+                nodes.append(dict(id=d.id))
+                continue
+
+            owner = d.permissions.owner.name
+            nodes.append(dict(id=d.id, name=d.name, owner=owner,
+                              url=url_for('show_dataset', user=owner, dataset=d.name)))
+
+        return {'nodes': nodes,
+                'edges': [dict(source=source, destination=destination, depth=depth)
+                          for (source, destination), depth in sorted(edges.items())]}
+
+
 class Data(Resource):
     method_decorators = [authenticate]
 
-    def get(self, dataset, user=None):
-        dataset = db.session.query(models.Dataset).\
+    def get(self, owner, dataset, user=None):
+        dataset = db.session.query(models.Dataset).join(models.Permission).\
+                join(models.User).filter(models.User.name == owner).\
                 filter(models.Dataset.name == dataset).\
-                filter(models.Permission.owner == user).first()
+                first()
 
         if dataset is None:
             abort(404, error="Dataset `{}' does not exist".format(dataset))
 
+        if not access.get_permissions(user, dataset)['read']:
+            abort(403, error="No read permission for this dataset")
+
         fileobj = memtar.create_tar(fs.path_of(dataset))
         fileobj.seek(0)
 
@@ -237,17 +391,80 @@ class Data(Resource):
                 if not data:
                     break
 
+                metrics.tar_bytes.inc(len(data), direction='download')
                 yield data
 
         return Response(generate(), mimetype='application/gzip')
 
-    def post(self, dataset, user=None):
-        dataset = db.session.query(models.Dataset).\
-                filter(models.Dataset.name == dataset).\
-                filter(models.Permission.owner == user).first()
+    def post(self, owner, dataset, user=None):
+        name = dataset
+        dataset = db.session.query(models.Dataset).join(models.Permission).\
+                filter(models.Permission.owner == user).\
+                filter(models.Dataset.name == name).\
+                first()
+
+        if dataset is None or user.name != owner:
+            abort(404, error="Dataset `{}' does not exist".format(name))
+
+        # one lookup of the counters up front, the archive is then checked
+        # member by member while it streams in
+        remaining = quota.available(user.id, dataset.collection_id)
+
+        if remaining == 0:
+            abort(413, error="Quota exceeded")
+
+        def admit(size):
+            if remaining is not None and size > remaining:
+                raise quota.QuotaExceeded("Upload exceeds the remaining quota of {} bytes".format(remaining))
+
+        def check(staging, sums, files, size):
+            checksums.verify_upload(staging, sums)
+
+            # remaining may be gone by now, charge before the files are moved
+            # into place and against the current counters
+            quota.charge(dataset, size, files, enforce=True)
+
+        stream = memtar.Counter(request.stream)
+        path = fs.path_of(dataset)
+        manifest = checksums.load(path)
+
+        try:
+            files, size, sums = memtar.extract_stream(stream, path, admit, checksums.new, check)
+        except quota.QuotaExceeded as e:
+            db.session.rollback()
+            abort(413, error=str(e))
+        except checksums.ChecksumMismatch as e:
+            abort(400, error=str(e))
+        except tarfile.TarError:
+            abort(400, error="Data must be a gzipped tar archive")
+        finally:
+            metrics.tar_bytes.inc(stream.count, direction='upload')
+
+        # an uploaded manifest was only checked, ours replaces it
+        manifest.update(sums)
+        checksums.save(path, manifest)
+        db.session.commit()
+
+
+class Checksums(Resource):
+    method_decorators = [authenticate]
+
+    def get(self, owner, dataset, user=None):
+        name = dataset
+        dataset = db.session.query(models.Dataset).join(models.Permission).\
+                join(models.User).filter(models.User.name == owner).\
+                filter(models.Dataset.name == name).\
+                first()
+
+        if dataset is None:
+            abort(404, error="Dataset `{}' does not exist".format(name))
+
+        if not access.get_permissions(user, dataset)['read']:
+            abort(403, error="No read permission for this dataset")
 
-        f = io.BytesIO(request.data)
-        memtar.extract_tar(f, fs.path_of(dataset))
+        return dict(algorithm=checksums.algorithm(), files=checksums.load(fs.path_of(dataset)),
+                    verified=dataset.verified.isoformat() if dataset.verified else None,
+                    damaged=dataset.damaged)
 
 class Search(Resource):
     method_decorators = [authenticate]
@@ -260,6 +477,9 @@ class Search(Resource):
         if query is None:
             abort(400, error="No query specified.")
 
+        if search.health.available is False:
+            abort(503, error="Search is currently not available.")
+
         body = {
             'sort': [
                 { 'name': 'asc' }
@@ -279,33 +499,59 @@ class Search(Resource):
         hits = es.search(index='datasets', doc_type='dataset', body=body)
         hits = [h['_source'] for h in hits['hits']['hits']]
 
-        return [{'name': h['name'],
-                 'description': h['description'],
-                 'url': url_for('show_dataset', user=h['owner'], dataset=h['name']),
-                 'owner': h['owner'],
-                 'owner_url': url_for('profile', name=h['owner']),
-                 'collection': h['collection'],
-                 'collection_url': url_for('show_collection', collection_name=h['collection'])}
-                 for h in hits]
+        # names are only unique per owner
+        ratings = dict(((owner, d.name), d) for d, owner in
+                       db.session.query(models.Dataset, models.User.name).\
+                       select_from(models.Dataset).join(models.Permission).\
+                       join(models.User, models.User.id == models.Permission.owner_id).\
+                       options(load_only('name', 'review_count', 'rating_sum')).\
+                       filter(models.Dataset.name.in_([h['name'] for h in hits])))
+
+        results = []
+
+        for h in hits:
+            d = ratings.get((h['owner'], h['name']))
+            results.append({'name': h['name'],
+                            'rating': d.rating if d is not None else 0,
+                            'review_count': d.review_count if d is not None else 0,
+                            'description': h['description'],
+                            'url': url_for('show_dataset', user=h['owner'], dataset=h['name']),
+                            'owner': h['owner'],
+                            'owner_url': url_for('profile', name=h['owner']),
+                            'collection': h['collection'],
+                            'collection_url': url_for('show_collection', collection_name=h['collection'])})
+
+        return results
 
 
 class UserBookmarks(Resource):
     method_decorators = [authenticate]
 
     def get(self, username, user=None):
-        bookmarks = db.session.query(models.Bookmark).join(models.User).\
-                  filter(models.User.name == username).all()
-        datasets = []
-        for b in bookmarks:
-            datasets.append(b.dataset)
-        return [{'name': d.name,
+        datasets = [b.dataset for b in logic.get_bookmarks(username)]
+        return caching.conditional([{'name': d.name,
                 'description': d.description,
                 'url': url_for('show_dataset', user=d.permissions.owner.name, dataset=d.name),
                 'owner': d.permissions.owner.name,
                 'owner_url': url_for('profile', name=d.permissions.owner.name),
                 'collection': d.collection.name,
                 'collection_url': url_for('show_collection', collection_name=d.collection.name)}
-                for d in datasets]
+                for d in datasets])
+
+
+class UserUsage(Resource):
+    method_decorators = [authenticate]
+
+    def get(self, username, user=None):
+        if user.name != username and not user.is_admin:
+            abort(403, error="Cannot see the usage of other users")
+
+        owner = models.User.query.filter(models.User.name == username).first()
+
+        if owner is None:
+            abort(404, error="User `{}' does not exist".format(username))
+
+        return quota.usage(owner)
 
 
 class Bookmarks(Resource):
@@ -324,11 +570,18 @@ class Bookmarks(Resource):
             # bookmark exists already
             return 200
 
-        dataset, permission = db.session.query(models.Dataset, models.Permission).\
+        if not notify.bookmark_limit.allow(user.id):
+            abort(429, error="Too many bookmarks, try again later")
+
+        dataset = db.session.query(models.Dataset).join(models.Permission).\
+                join(models.User).filter(models.User.name == owner).\
                 filter(models.Dataset.name == dataset).\
                 first()
 
-        if not permission.can_interact:
+        if dataset is None:
+            abort(404, error="Dataset does not exist for this user")
+
+        if not access.get_permissions(user, dataset)['interact']:
             abort(401, error="Unauthorised permissions")
 
         bookmark = models.Bookmark(user, dataset)
@@ -339,11 +592,8 @@ class Bookmarks(Resource):
         if user.name == owner:
             return 201
 
-        # FIXME: ratelimit bookmarking or DOS attacks become a piece of cake
-        message = "{} bookmarked {}".format(owner, dataset.name)
-        notification = models.Notification(owner, type='bookmark', message=message)
-        db.session.add(notification)
-        db.session.commit()
+        notify.enqueue(get_dataset_owner(dataset), 'bookmark', dataset.name, user.name,
+                       "{actors} bookmarked {subject}")
 
         return 201
 
@@ -372,11 +622,15 @@ class Reviews(Resource):
         comment = data['comment']
         rating = data['rating']
 
-        dataset, permission = db.session.query(models.Dataset, models.Permission).\
+        dataset = db.session.query(models.Dataset).join(models.Permission).\
+                join(models.User).filter(models.User.name == owner).\
                 filter(models.Dataset.name == dataset).\
                 first()
 
-        if not permission.can_interact:
+        if dataset is None:
+            abort(404, error="Dataset does not exist for this user")
+
+        if not access.get_permissions(user, dataset)['interact']:
             abort(401, error="Unauthorised Permissions")
 
         review = db.session.query(models.Review).\
@@ -384,10 +638,15 @@ class Reviews(Resource):
                 filter(models.Review.dataset == dataset).\
                 first()
 
+        # aggregates are updated with SQL expressions in the same transaction
+        # so that concurrent reviews cannot lose increments
         if review is None:
             review = models.Review(user, dataset, rating, comment)
+            dataset.review_count = models.Dataset.review_count + 1
+            dataset.rating_sum = models.Dataset.rating_sum + rating
             db.session.add(review)
         else:
+            dataset.rating_sum = models.Dataset.rating_sum + rating - review.rating
             review.comment = comment
             review.rating = rating
 
@@ -398,61 +657,89 @@ class Reviews(Resource):
         if owner.id == user.id:
             return 201
 
-        message = "{} reviewed {}".format(user.name, dataset.name)
-        notification = models.Notification(owner, type='review', message=message)
-        db.session.add(notification)
-        db.session.commit()
+        notify.enqueue(owner, 'review', dataset.name, user.name, "{actors} reviewed {subject}")
 
         return 200
 
     def delete(self, owner, dataset, user=None):
+        # only the caller's own review of this owner's dataset
         review = db.session.query(models.Review).join(models.Dataset).\
+                join(models.Permission, models.Permission.dataset_id == models.Dataset.id).\
+                join(models.User, models.User.id == models.Permission.owner_id).\
+                filter(models.User.name == owner).\
                 filter(models.Dataset.name == dataset).\
+                filter(models.Review.user_id == user.id).\
                 first()
 
         if review is None:
             abort(404, error="Review not found")
 
+        dataset = review.dataset
+        dataset.review_count = models.Dataset.review_count - 1
+        dataset.rating_sum = models.Dataset.rating_sum - review.rating
         db.session.delete(review)
         db.session.commit()
         return 200
 
     def get(self, owner, dataset, user=None):
-        dataset = db.session.query(models.Dataset).\
-                filter(models.Dataset.name == dataset).\
+        parser = reqparse.RequestParser()
+        parser.add_argument('after', type=int)
+        parser.add_argument('limit', type=int, default=app.config['NOVA_API_PAGE_SIZE'])
+        args = parser.parse_args()
+
+        limit = max(1, min(args.limit, app.config['NOVA_API_MAX_PAGE_SIZE']))
+        name = dataset
+
+        dataset = db.session.query(models.Dataset).join(models.Permission).\
+                join(models.User).filter(models.User.name == owner).\
+                filter(models.Dataset.name == name).\
                 first()
 
-        reviews = db.session.query(models.Review).\
-                filter(models.Review.dataset == dataset)
+        if dataset is None:
+            abort(404, error="Dataset `{}' does not exist".format(name))
+
+        # every review change also changes the aggregates and thus the version
+        etag = caching.etag_of('reviews', dataset.id, dataset.version, user.id, args.after, limit)
 
-        number = reviews.count()
-        total = 0
-        data = []
-        i_reviewed = False;
+        if caching.matches(etag):
+            return caching.not_modified(etag)
 
-        for review in reviews:
-            total += review.rating
-            current_i_review = False
+        reviews = logic.get_reviews(dataset).order_by(models.Review.id.desc())
 
-            if review.user == user:
-                i_reviewed = True
-                current_i_review = True
+        if args.after is not None:
+            reviews = reviews.filter(models.Review.id < args.after)
 
-            data.append(dict(name=review.user.name, url=url_for('profile', name=review.user.name),
-                             rating=review.rating, comment=review.comment,
-                             created_at=str(review.created_at),
-                             editable=current_i_review))
+        reviews = reviews.limit(limit).all()
 
-        average = total / float(number) if number > 0 else 0
-        return {'count': number, 'rating': average, 'data': data, 'self_reviewed': i_reviewed}
+        i_reviewed = db.session.query(models.Review.id).\
+                filter(models.Review.dataset_id == dataset.id).\
+                filter(models.Review.user_id == user.id).\
+                first() is not None
+
+        data = [dict(name=review.user.name, url=url_for('profile', name=review.user.name),
+                     rating=review.rating, comment=review.comment,
+                     created_at=str(review.created_at),
+                     editable=review.user_id == user.id)
+                for review in reviews]
+
+        after = reviews[-1].id if len(reviews) == limit else None
+
+        return {'count': dataset.review_count, 'rating': dataset.rating, 'data': data,
+                'self_reviewed': i_reviewed, 'next': after}, 200, caching.headers(etag)
 
 
 class Notifications(Resource):
     method_decorators = [authenticate]
 
     def get(self, user=None):
+        parser = reqparse.RequestParser()
+        parser.add_argument('since', type=int, default=0)
+        args = parser.parse_args()
+
         notifications = db.session.query(models.Notification).\
             filter(models.Notification.user_id == user.id).\
+            filter(models.Notification.id > args.since).\
+            order_by(models.Notification.id).\
             all()
 
         return {'notifications': [n.to_dict() for n in notifications]}
@@ -472,6 +759,34 @@ class Notifications(Resource):
         return 200
 
 
+class NotificationStream(Resource):
+    def get(self):
+        # EventSource cannot send headers but sends the session cookie. Tokens
+        # are not accepted as a parameter, they would end up in access logs.
+        if 'Auth-Token' in request.headers:
+            user_id = users.check_token(request.headers['Auth-Token']).id
+        elif current_user.is_authenticated:
+            user_id = current_user.id
+        else:
+            abort(401)
+        since = request.headers.get('Last-Event-ID', request.args.get('since'))
+
+        # subscribe before catching up, so nothing falls between the two
+        queue = notify.broker.subscribe(user_id)
+        pending = []
+
+        if since is not None and since.isdigit():
+            pending = [n.to_dict() for n in
+                       db.session.query(models.Notification).\
+                       filter(models.Notification.user_id == user_id).\
+                       filter(models.Notification.id > int(since)).\
+                       order_by(models.Notification.id)]
+
+        stream = notify.stream(queue, user_id, pending, app.config['NOVA_NOTIFICATION_KEEPALIVE'])
+        headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        return Response(stream, mimetype='text/event-stream', headers=headers)
+
+
 class Notification(Resource):
     method_decorators = [authenticate]
 
@@ -632,25 +947,25 @@ class DirectAccess(Resource):
         if access_request is None:
             abort(404, "Request does not exists")
 
-        access = db.session.query(models.DirectAccess).\
-            filter(models.Dataset.name == dataset_name).\
+        direct_access = db.session.query(models.DirectAccess).\
+            filter(models.DirectAccess.dataset == access_request.dataset).\
             filter(models.DirectAccess.user == access_request.user).\
             first()
 
         permissions = request.get_json()
 
-        if access is not None:
-            access.can_read = permissions['read']
-            access.can_interact = permissions['interact']
-            access.can_fork = permissions['fork']
+        if direct_access is not None:
+            direct_access.can_read = permissions['read']
+            direct_access.can_interact = permissions['interact']
+            direct_access.can_fork = permissions['fork']
         else:
-            access = models.DirectAccess(user=user.name, can_read=permissions['read'],
+            direct_access = models.DirectAccess(user=access_request.user,
+                    dataset=access_request.dataset, can_read=permissions['read'],
                     can_interact=permissions['interact'], can_fork=permissions['fork'])
-            db.session.add(access)
+            db.session.add(direct_access)
 
-        message = '{} granted access to {}'.format(user.name, dataset_name)
-        notification = models.Notification(access_request.user, type='bookmark', message=message)
-        db.session.add(notification)
+        notify.enqueue(access_request.user, 'bookmark', dataset_name, user.name,
+                       "{actors} granted access to {subject}")
         db.session.delete(access_request)
         db.session.commit()
 
@@ -666,9 +981,8 @@ class DirectAccess(Resource):
 
         # notify requester
         if access_request is not None:
-            message = '{} denied access to {}'.format(user.name, dataset_name)
-            notification = models.Notification(access_request.user, type='bookmark', message=message)
-            db.session.add(notification)
+            notify.enqueue(access_request.user, 'bookmark', dataset_name, user.name,
+                           "{actors} denied access to {subject}")
             db.session.delete(access_request)
             db.session.commit()
 
@@ -705,3 +1019,44 @@ class UserSearch(Resource):
         for r in results:
             json_results.append(r.to_dict())
         return json_results
+
+
+class TaxonomyImports(Resource):
+    method_decorators = [authenticate]
+
+    def get(self, user=None):
+        jobs = models.TaxonomyImport.query.filter(models.TaxonomyImport.user == user).\
+            order_by(models.TaxonomyImport.id.desc())
+        return [job.to_dict() for job in jobs]
+
+    def post(self, user=None):
+        if 'csv' not in request.files:
+            abort(400, error="No CSV file uploaded.")
+
+        job = taxonomy.start(user, request.files['csv'])
+        return job.to_dict(), 202, {'Location': url_for('taxonomyimport', job_id=job.id)}
+
+
+class TaxonomyImport(Resource):
+    method_decorators = [authenticate]
+
+    def get_job(self, job_id, user):
+        job = models.TaxonomyImport.query.get(job_id)
+
+        if job is None or job.user != user:
+            abort(404, error="Import {} does not exist".format(job_id))
+
+        return job
+
+    def get(self, job_id, user=None):
+        return self.get_job(job_id, user).to_dict()
+
+    def post(self, job_id, user=None):
+        job = self.get_job(job_id, user)
+
+        if job.status == 'done':
+            abort(400, error="Import {} is already done".format(job_id))
+
+        # continues after the last committed batch
+        tasks.import_taxonomy.delay(job.id)
+        return job.to_dict(), 202
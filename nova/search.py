@@ -1,11 +1,93 @@
-from nova import db, es
+import atexit
+import threading
+from nova import app, db, es
 from nova.models import Dataset, Permission
 
 
+class HealthCheck(object):
+    # Pings Elasticsearch in the background instead of blocking startup.
+    # `available' is None until the first ping returned.
+    def __init__(self, interval):
+        self.interval = interval
+        self.available = None
+        self.thread = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run)
+                self.thread.daemon = True
+                self.thread.start()
+
+    def check(self):
+        try:
+            available = es.ping()
+        except Exception:
+            available = False
+
+        if available != self.available:
+            if available:
+                app.logger.info("Elasticsearch is available")
+            else:
+                app.logger.warning("Cannot connect to Elasticsearch, search is disabled")
+
+        self.available = available
+        return available
+
+    def run(self):
+        self.check()
+
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self.stopped.set()
+
+        # a daemon thread still pinging while the interpreter shuts down
+        # crashes Python 2
+        if self.thread is not None:
+            self.thread.join(5)
+
+
+health = HealthCheck(app.config['NOVA_ELASTICSEARCH_CHECK_INTERVAL'])
+
+atexit.register(health.stop)
+
+
+def document(dataset, owner, collection):
+    tokenized = dataset.name.lower().replace('_', ' ')
+    return dict(name=dataset.name, tokenized=tokenized, owner=owner,
+                description=dataset.description, collection=collection)
+
+
 def insert(dataset):
     permission = Permission.query.filter(Permission.dataset_id == dataset.id).first()
-    tokenized = dataset.name.lower().replace('_', ' ')
-    body = dict(name=dataset.name, tokenized=tokenized,
-                owner=permission.owner.name, description=dataset.description,
-                collection=dataset.collection.name)
+    body = document(dataset, permission.owner.name, dataset.collection.name)
     es.create(index='datasets', doc_type='dataset', body=body)
+
+
+def try_insert(dataset):
+    """Index a committed dataset unless Elasticsearch is known to be down.
+    Failures are only logged, the next reindex adds the missing entry."""
+    if health.available is False:
+        return False
+
+    try:
+        insert(dataset)
+        return True
+    except Exception as e:
+        app.logger.warning("Cannot index {}: {}".format(dataset.name, e))
+        return False
+
+
+def insert_many(documents):
+    body = []
+
+    for document in documents:
+        body.append({'index': {'_index': 'datasets', '_type': 'dataset'}})
+        body.append(document)
+
+    if body:
+        es.bulk(body=body)
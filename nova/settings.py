@@ -2,3 +2,62 @@ DEBUG = False
 NOVA_ENABLE_FILE_LISTING = True
 SQLALCHEMY_TRACK_MODIFICATIONS = True
 CELERY_BROKER_URL = 'amqp://guest@localhost//'
+NOVA_TOKEN_CACHE_SIZE = 1024
+NOVA_TOKEN_CACHE_TTL = 60
+NOVA_PASSWORD_SCHEMES = ['pbkdf2_sha512']
+NOVA_PASSWORD_OPTIONS = {
+    'pbkdf2_sha512__default_rounds': 50000,
+    'pbkdf2_sha512__min_rounds': 50000,
+    'pbkdf2_sha512__salt_size': 16,
+}
+NOVA_PASSWORD_WORKERS = 2
+NOVA_API_PAGE_SIZE = 100
+NOVA_API_MAX_PAGE_SIZE = 1000
+NOVA_DATABASE_POOL = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_timeout': 30,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True,
+}
+NOVA_SQLITE_PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', 5000),
+    ('cache_size', -65536),
+    ('mmap_size', 268435456),
+]
+NOVA_SQLITE_READERS = 4
+NOVA_NOTIFICATION_KEEPALIVE = 30
+NOVA_NOTIFICATION_WINDOW = 10
+NOVA_BOOKMARK_RATE_LIMIT = (30, 60)
+NOVA_LINEAGE_MAX_DEPTH = 100
+NOVA_SERVICE_REFRESH = 10
+NOVA_SERVICE_TTL = 300
+NOVA_SERVICE_CHECK_INTERVAL = 60
+NOVA_ELASTICSEARCH_CHECK_INTERVAL = 30
+NOVA_CELERY_METRICS_PORT = None
+NOVA_METRICS_DIR = None
+NOVA_PROFILE_SAMPLE_RATE = 0
+NOVA_PROFILE_INTERVAL = 0.005
+NOVA_PROFILE_KEEP = 50
+NOVA_IMPORT_BATCH_SIZE = 500
+NOVA_BULK_MAX_DATASETS = 10000
+NOVA_BULK_WORKERS = 8
+NOVA_WATCH_DEBOUNCE = 2
+NOVA_WATCH_MAX_DELAY = 30
+NOVA_WATCH_POLL_INTERVAL = 10
+NOVA_WATCH_REGISTER = False
+NOVA_WATCH_COLLECTION = 'incoming'
+NOVA_GC_RATE = 500
+NOVA_GC_INTERVAL = 300
+NOVA_GC_SWEEP_INTERVAL = 86400
+NOVA_USER_QUOTA = None
+NOVA_COLLECTION_QUOTA = None
+NOVA_CHECKSUM_ALGORITHM = 'sha256'
+NOVA_SCRUB_INTERVAL = 3600
+NOVA_SCRUB_RATE = 50 * 1024 * 1024
+NOVA_SCRUB_BUDGET = 100 * 1024 * 1024 * 1024
+CACHE_TYPE = 'null'
+CACHE_NO_NULL_WARNING = True
+CACHE_DEFAULT_TIMEOUT = 300
@@ -122,20 +122,50 @@ var notification = new Vue ({
     notifications: []
   },
   created: function() {
-    this.loadNotifications()
+    var loaded = this.loadNotifications()
 
-    setInterval(function() {
-      this.loadNotifications()
-    }.bind(this), 30000);
+    if (window.EventSource) {
+      // subscribe once the list is there, otherwise since=0 replays everything
+      loaded.then(() => {
+        this.subscribe()
+      })
+    }
+    else {
+      setInterval(function() {
+        this.loadNotifications()
+      }.bind(this), 30000);
+    }
   },
   methods: {
     loadNotifications: function () {
       var headers = { 'Auth-Token': this.token }
 
-      this.$http.get('/api/notifications', {headers: headers}).then((response) => {
+      return this.$http.get('/api/notifications', {headers: headers}).then((response) => {
         this.notifications = response.body.notifications
       })
     },
+    lastId: function () {
+      var last = 0
+
+      for (var i = 0; i < this.notifications.length; i++) {
+        last = Math.max(last, this.notifications[i].id)
+      }
+
+      return last
+    },
+    subscribe: function () {
+      // authenticated by the session cookie, EventSource cannot send headers
+      var url = '/api/notifications/stream?since=' + this.lastId()
+      var source = new EventSource(url)
+
+      source.onmessage = function (event) {
+        var data = JSON.parse(event.data)
+
+        if (data.id > this.lastId()) {
+          this.notifications.push(data)
+        }
+      }.bind(this)
+    },
     dismissNotification: function (notification_id) {
       var headers = { 'Auth-Token': this.token }
 
@@ -1,10 +1,8 @@
 import os
 import requests
-import shutil
 import subprocess
 import shlex
-from celery import Celery
-from nova import celery, utils, db, models
+from nova import app, celery, utils, db, models, registry, taxonomy, garbage, quota, checksums
 
 URL = 'http://127.0.0.1:5000/api/datasets'
 
@@ -32,15 +30,72 @@ def copy(token, name, parent_id):
     # check path info of new dataset
     dst = get_dataset_info(token, result['id'])
 
+    dataset = models.Dataset.query.get(dst['id'])
+    source = models.Dataset.query.get(parent_id)
+
+    try:
+        quota.admit(dataset, source.size or 0)
+    except quota.QuotaExceeded as e:
+        app.logger.warning("Not copying {} to {}: {}".format(src['path'], dst['path'], e))
+        return
+
     # NOTE: we are doing a fast path here and I am not sure if this is really
     # the way to go ...
 
-    utils.copy(src['path'], dst['path'])
+    files, size = utils.copy(src['path'], dst['path'])
+    quota.charge(dataset, size, files)
+    db.session.commit()
+
+
+@celery.on_after_configure.connect
+def setup_periodic_tasks(sender, **kwargs):
+    sender.add_periodic_task(app.config['NOVA_SERVICE_CHECK_INTERVAL'], check_services.s())
+    sender.add_periodic_task(app.config['NOVA_GC_INTERVAL'], collect_garbage.s())
+    sender.add_periodic_task(app.config['NOVA_GC_SWEEP_INTERVAL'], sweep_orphans.s())
+    sender.add_periodic_task(app.config['NOVA_SCRUB_INTERVAL'], scrub.s())
+
+
+@celery.task
+def check_services():
+    for service in registry.services.values():
+        try:
+            requests.head(service['url'], timeout=5)
+        except requests.RequestException:
+            continue
+
+        registry.services.touch(service['name'])
+
+    # services that neither answered nor registered again within the TTL
+    registry.services.expire()
+
+
+# acknowledged after running so that a lost worker's import is redelivered
+# and continues where it stopped
+@celery.task(acks_late=True)
+def import_taxonomy(job_id):
+    taxonomy.run(job_id)
+
+
+@celery.task
+def collect_garbage():
+    garbage.collect()
+
+
+@celery.task
+def sweep_orphans():
+    orphans = garbage.sweep()
+
+    for path, files, size in orphans:
+        app.logger.warning("Orphaned {} with {} files and {} bytes".format(path, files, size))
+
+    if orphans:
+        app.logger.warning("{} orphaned directories with {} bytes below {}".format(
+            len(orphans), sum(size for _, _, size in orphans), app.config['NOVA_ROOT_PATH']))
 
 
 @celery.task
-def rmtree(path):
-    shutil.rmtree(path)
+def scrub():
+    checksums.scrub()
 
 
 @celery.task
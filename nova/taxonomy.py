@@ -0,0 +1,161 @@
+import os
+import csv
+import json
+import uuid
+import datetime
+from sqlalchemy import select, bindparam, func
+from sqlalchemy.dialects import postgresql
+from nova import app, db, models, caching
+
+
+MAX_ERRORS = 100
+
+LOOKUPS = ((models.Genus, 'genus_id'), (models.Family, 'family_id'), (models.Order, 'order_id'))
+
+
+def start(user, upload):
+    """Store an uploaded CSV file and queue its import."""
+    directory = os.path.join(os.path.abspath(app.config['NOVA_ROOT_PATH']), '.imports')
+
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    path = os.path.join(directory, '{}.csv'.format(uuid.uuid4().hex))
+    upload.save(path)
+
+    job = models.TaxonomyImport(user=user, filename=upload.filename, path=path,
+                                size=os.path.getsize(path))
+    db.session.add(job)
+    db.session.commit()
+
+    from nova import tasks
+    tasks.import_taxonomy.delay(job.id)
+    return job
+
+
+def insert_missing(connection, table, names):
+    if not names:
+        return {}
+
+    rows = [dict(name=name) for name in names]
+
+    if connection.dialect.name == 'postgresql':
+        connection.execute(postgresql.insert(table).on_conflict_do_nothing(index_elements=['name']), rows)
+    else:
+        connection.execute(table.insert().prefix_with('OR IGNORE'), rows)
+
+    query = select([table.c.name, table.c.id]).where(table.c.name.in_(names))
+    return dict(connection.execute(query).fetchall())
+
+
+def import_batch(connection, rows):
+    """Upsert the lookups of a batch and fill in missing ones of its scans.
+    Returns the number of updated scans and errors for unknown scans."""
+    names = set(row[0] for _, row in rows)
+    datasets = models.Dataset.__table__
+    scans = models.SampleScan.__table__
+
+    query = select([datasets.c.name, datasets.c.id]).\
+        select_from(datasets.join(scans, scans.c.id == datasets.c.id)).\
+        where(datasets.c.name.in_(names))
+    scan_ids = dict(connection.execute(query).fetchall())
+
+    ids = {}
+
+    for i, (model, _) in enumerate(LOOKUPS):
+        wanted = set(row[2 + i] for _, row in rows if row[2 + i] and row[0] in scan_ids)
+        ids[model] = insert_missing(connection, model.__table__, wanted)
+
+    updates = []
+    errors = []
+
+    for line, row in rows:
+        if row[0] not in scan_ids:
+            errors.append(dict(line=line, error="Unknown scan `{}'".format(row[0])))
+            continue
+
+        update = dict(scan_id=scan_ids[row[0]])
+
+        for i, (model, column) in enumerate(LOOKUPS):
+            update[column] = ids[model].get(row[2 + i])
+
+        updates.append(update)
+
+    if updates:
+        # like the old row by row import, only fill in what is not set yet
+        statement = scans.update().where(scans.c.id == bindparam('scan_id')).values(
+            **{column: func.coalesce(scans.c[column], bindparam(column)) for _, column in LOOKUPS})
+        connection.execute(statement, updates)
+
+    return len(updates), errors
+
+
+def run(job_id):
+    """Import a CSV file in batches. Progress is committed together with each
+    batch, so a job that was interrupted continues after the last batch."""
+    job = models.TaxonomyImport.query.get(job_id)
+
+    if job is None or job.status == 'done':
+        return
+
+    job.status = 'running'
+    db.session.commit()
+
+    batch_size = app.config['NOVA_IMPORT_BATCH_SIZE']
+    imports = models.TaxonomyImport.__table__
+    errors = json.loads(job.errors or '[]')
+    position, count, updated = job.position, job.rows, job.updated
+
+    try:
+        with open(job.path, 'rb') as f:
+            f.seek(position)
+            line = count
+            done = False
+
+            while not done:
+                rows = []
+
+                # readline() keeps tell() exact, the csv module's iterator reads ahead
+                while len(rows) < batch_size:
+                    data = f.readline()
+
+                    if not data:
+                        done = True
+                        break
+
+                    line += 1
+
+                    if not data.strip():
+                        continue
+
+                    row = next(csv.reader([data]))
+
+                    if len(row) != 5:
+                        errors.append(dict(line=line, error="Expected 5 columns, got {}".format(len(row))))
+                        continue
+
+                    rows.append((line, [x.strip().decode('utf-8') for x in row]))
+
+                with db.engine.begin() as connection:
+                    n, batch_errors = import_batch(connection, rows) if rows else (0, [])
+                    errors.extend(batch_errors)
+                    position, count, updated = f.tell(), line, updated + n
+                    connection.execute(imports.update().where(imports.c.id == job_id).values(
+                        position=position, rows=count, updated=updated,
+                        errors=json.dumps(errors[:MAX_ERRORS])))
+
+                caching.invalidate('samplescans', 'genuses', 'families', 'orders')
+
+        status = 'done'
+    except Exception as e:
+        errors.append(dict(line=None, error=str(e)))
+        status = 'failed'
+
+    db.session.expire(job)
+    job.status = status
+    job.errors = json.dumps(errors[:MAX_ERRORS])
+    job.finished = datetime.datetime.utcnow()
+    db.session.commit()
+
+    if status == 'done':
+        os.unlink(job.path)
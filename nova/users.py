@@ -1,4 +1,10 @@
-from nova import db, models
+import time
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+from flask_restful import abort
+from sqlalchemy_utils import Password
+from nova import app, db, models
 
 
 class InvalidTokenFormat(ValueError):
@@ -6,20 +12,139 @@ class InvalidTokenFormat(ValueError):
     pass
 
 
+class TokenCache(object):
+    def __init__(self, size=1024, ttl=300):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, token):
+        with self.lock:
+            entry = self.entries.pop(token, None)
+
+            if entry is None or entry[2] < time.time():
+                self.misses += 1
+                return None
+
+            # re-insert to keep the most recently used entries at the end
+            self.entries[token] = entry
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token, user):
+        with self.lock:
+            self.entries.pop(token, None)
+            self.entries[token] = (user.id, user, time.time() + self.ttl)
+
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, uid):
+        with self.lock:
+            for token in [t for t, e in self.entries.items() if e[0] == uid]:
+                del self.entries[token]
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / float(total) if total > 0 else 0
+        return dict(size=len(self.entries), hits=self.hits,
+                    misses=self.misses, hit_rate=rate)
+
+
+class PasswordHasher(object):
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.pool = None
+        self.lock = threading.Lock()
+        self.count = 0
+        self.rehashed = 0
+        self.total = 0.0
+        self.slowest = 0.0
+
+    @property
+    def context(self):
+        return models.User.__table__.c.password.type.context
+
+    def run(self, func, *args):
+        # The pool is created lazily so that it is not shared across forked
+        # workers.
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPool(self.workers)
+
+        return self.pool.apply(func, args)
+
+    def hash(self, password):
+        return Password(self.run(self.context.hash, password), context=self.context)
+
+    def verify(self, user, password):
+        start = time.time()
+        valid, new_hash = self.run(self.context.verify_and_update, password, user.password.hash)
+
+        if valid and new_hash:
+            # tokens signed with the old hash would silently stop working
+            legacy = user.token is not None and not user.signs_token(user.get_signer(), user.token)
+            user.password = Password(new_hash, context=self.context)
+            db.session.commit()
+
+            if legacy:
+                token_cache.invalidate(user.id)
+                user.generate_token()
+
+        elapsed = time.time() - start
+
+        with self.lock:
+            self.count += 1
+            self.rehashed += 1 if valid and new_hash else 0
+            self.total += elapsed
+            self.slowest = max(self.slowest, elapsed)
+
+        return valid
+
+    def stats(self):
+        average = self.total / self.count if self.count > 0 else 0
+        return dict(workers=self.workers, logins=self.count, rehashed=self.rehashed,
+                    average=average, slowest=self.slowest)
+
+
+token_cache = TokenCache(app.config['NOVA_TOKEN_CACHE_SIZE'],
+                         app.config['NOVA_TOKEN_CACHE_TTL'])
+
+password_hasher = PasswordHasher(app.config['NOVA_PASSWORD_WORKERS'])
+
+
 def check_token(token):
-    uid, signature = token.split('.')
+    # Cached users are detached and never expired, so merging them back without
+    # loading gives us a session-bound user without loading it again. The
+    # cache is per process, compare the token with the database so that
+    # tokens revoked or regenerated in another process stop working at once.
+    user = token_cache.get(token)
+
+    if user is not None:
+        current = db.session.query(models.User.token).filter(models.User.id == user.id).scalar()
+
+        if current == token:
+            return db.session.merge(user, load=False)
+
+        token_cache.invalidate(user.id)
+
     try:
         user = from_token(token)
     except InvalidTokenFormat as e:
         abort(400)
 
     if user is None:
-        abort(401, "Unknown user")
+        abort(401, message="Unknown user")
 
     if not user.is_token_valid(token):
         abort(401)
 
-    return user
+    db.session.expunge(user)
+    token_cache.put(token, user)
+    return db.session.merge(user, load=False)
 
 
 def from_token(token):
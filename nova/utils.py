@@ -1,18 +1,50 @@
 import os
 import shutil
-from nova import app
+from nova import app, checksums
+
+
+def copy_file(src, dst, digest):
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        for chunk in iter(lambda: fsrc.read(checksums.CHUNK_SIZE), ''):
+            digest.update(chunk)
+            fdst.write(chunk)
+
+    shutil.copystat(src, dst)
+    return digest.hexdigest()
 
 
 def copy(src_path, dst_path):
+    """Copy new and changed files, returns the number of new files and the
+    bytes dst_path grew by. Checksums are computed while copying and checked
+    against the manifest of the source."""
+    grown = [0, 0]
+    expected = checksums.load(src_path)
+    manifest = checksums.load(dst_path)
+    manifest.update(expected)
+
     def copytree(src, dst, symlinks=False, ignore=None):
         for item in os.listdir(src):
             s = os.path.join(src, item)
             d = os.path.join(dst, item)
             if os.path.isdir(s):
+                if not os.path.exists(d):
+                    os.mkdir(d)
                 copytree(s, d, symlinks, ignore)
             else:
-                if not os.path.exists(d) or os.stat(s).st_mtime - os.stat(d).st_mtime > 1:
-                    shutil.copy2(s, d)
+                exists = os.path.exists(d)
+
+                if not exists or os.stat(s).st_mtime - os.stat(d).st_mtime > 1:
+                    old = os.stat(d).st_size if exists else 0
+                    name = os.path.relpath(s, src_path)
+                    manifest[name] = copy_file(s, d, checksums.new())
+
+                    if expected.get(name, manifest[name]) != manifest[name]:
+                        app.logger.error("Checksum of {} does not match its manifest".format(s))
+
+                    grown[0] += 0 if exists else 1
+                    grown[1] += os.stat(d).st_size - old
 
     app.logger.info("Copy data from {} to {}".format(src_path, dst_path))
     copytree(src_path, dst_path)
+    checksums.save(dst_path, manifest)
+    return tuple(grown)
@@ -3,9 +3,9 @@ import io
 import re
 from functools import wraps
 from nova import (app, db, login_manager, fs, logic, memtar, tasks, models, es,
-        users, search, resources)
+        users, search, resources, access, caching, metrics, profiler, taxonomy, checksums)
 from nova.models import (User, Collection, Dataset, SampleScan, Genus, Family,
-        Order, Notification, Process, Bookmark, Permission,
+        Order, Notification, Process, Bookmark, Permission, Review, Membership,
         AccessRequest, DirectAccess)
 from flask import (Response, render_template, request, flash, redirect,
         url_for, jsonify, send_from_directory, abort)
@@ -123,7 +123,7 @@ def login():
             if user is None:
                 return render_template('user/login.html', form=form, error="User {} does not exist.".format(name), redirect_to=redirect_to), 401
 
-            if user.password == form.password.data:
+            if users.password_hasher.verify(user, form.password.data):
                 login_user(user)
                 flash('Logged in successfully')
                 if not redirect_to:
@@ -148,13 +148,14 @@ def logout():
 @app.route('/')
 @app.route('/<int:page>')
 @login_required(admin=False)
+@caching.cached_page(User, Dataset, Permission, AccessRequest)
 def index(page=1):
     if current_user.first_time:
         current_user.first_time = False
         db.session.commit()
         return render_template('index/welcome.html', user=current_user)
 
-    datasets = db.session.query(Dataset).\
+    datasets = db.session.query(Dataset).join(Permission).\
         filter(Permission.owner == current_user).\
         order_by(Dataset.created.desc()).limit(5).distinct().all()
 
@@ -171,15 +172,33 @@ def index(page=1):
 @login_required(admin=True)
 def admin():
     from nova.resources import services
+    from nova.users import token_cache, password_hasher
 
     users = db.session.query(User).all()
-    return render_template('user/admin.html', users=users, services=services.values())
+    return render_template('user/admin.html', users=users, services=services.values(),
+                           token_cache=token_cache.stats(),
+                           password_hasher=password_hasher.stats(),
+                           page_cache=caching.page_stats.stats(),
+                           search_available=search.health.available,
+                           profiles=profiler.profiles.list())
+
+
+@app.route('/metrics')
+def show_metrics():
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/settings/profiles/<filename>')
+@login_required(admin=True)
+def download_profile(filename):
+    return send_from_directory(profiler.profiles.path, filename, as_attachment=True)
 
 
 @app.route('/token/generate')
 @login_required(admin=False)
 def generate_token():
     current_user.generate_token()
+    users.token_cache.invalidate(current_user.id)
     return redirect('user/{}'.format(current_user.name))
 
 
@@ -188,6 +207,7 @@ def generate_token():
 def revoke_token():
     current_user.token = None
     db.session.commit()
+    users.token_cache.invalidate(current_user.id)
     return redirect('user/{}'.format(current_user.name))
 
 
@@ -197,8 +217,9 @@ def signup():
     form = SignupForm()
 
     if form.validate_on_submit():
+        password = users.password_hasher.hash(form.password.data)
         user = User(name=form.name.data, fullname=form.fullname.data,
-                    email=form.email.data, password=form.password.data,
+                    email=form.email.data, password=password,
                     is_admin=form.is_admin.data)
         db.session.add(user)
         db.session.commit()
@@ -211,20 +232,14 @@ def signup():
 @app.route('/user/<name>')
 @app.route('/user/<name>/<int:page>')
 @login_required(admin=False)
+@caching.cached_page(User, Dataset, Permission, Bookmark, DirectAccess, Membership)
 def profile(name, page=1):
     user = db.session.query(User).filter(User.name == name).first()
     bookmark_count = db.session.query(Bookmark).\
         filter(Bookmark.user == user).count()
-    datasets_publicperms = Dataset.query.join(Permission).\
-                            filter(Permission.owner == user).\
-                            filter(Permission.can_read == True)
-
-    datasets_directaccess = Dataset.query.join(Permission).\
-                          filter(Permission.owner == user).\
-                          join(DirectAccess).\
-                          filter(DirectAccess.user == current_user).\
-                          filter(DirectAccess.can_read == True)
-    datasets = datasets_directaccess.union(datasets_publicperms)
+    datasets = Dataset.query.join(Permission).\
+        filter(Permission.owner == user)
+    datasets = access.readable(datasets, current_user)
     pagination = datasets.paginate(page=page, per_page=8)
     return render_template('user/profile.html', user=user, pagination=pagination, bookmark_count=bookmark_count)
 
@@ -233,8 +248,7 @@ def profile(name, page=1):
 @login_required(admin=False)
 def list_bookmarks(name):
     user = db.session.query(User).filter(User.name == name).first()
-    bookmarks = db.session.query(models.Bookmark).join(models.User).\
-              filter(models.User.name == name).all()
+    bookmarks = logic.get_bookmarks(name).all()
     service = resources.services.get('thumbnail-server')
     return render_template('user/bookmarks.html', user=user,
             bookmarks=bookmarks, thumbnail_service=service)
@@ -269,50 +283,14 @@ def create_collection():
 @app.route('/update', methods=['POST'])
 @login_required(admin=False)
 def update():
-    import csv
-
-    # XXX: more danger zone!
-    genuses = {x.name: x for x in db.session.query(Genus).all()}
-    families = {x.name: x for x in db.session.query(Family).all()}
-    orders = {x.name: x for x in db.session.query(Order).all()}
-    scans = {x.name: x for x in db.session.query(SampleScan).all()}
-
-    with open(request.form['csv'], 'rb') as f:
-        reader = csv.reader(f)
-
-        for name, _, genus, family, order in reader:
-            if name in scans:
-                scan = scans[name]
-
-                if genus and not scan.genus:
-                    if genus in genuses:
-                        scan.genus = genuses[genus]
-                    else:
-                        g = Genus(name=genus)
-                        db.session.add(g)
-                        genuses[genus] = g
-                        scan.genus = g
-
-                if family and not scan.family:
-                    if family in families:
-                        scan.family = families[family]
-                    else:
-                        f = Family(name=family)
-                        db.session.add(f)
-                        families[family] = f
-                        scan.family = f
-
-                if order and not scan.order:
-                    if order in orders:
-                        scan.order = orders[order]
-                    else:
-                        o = Order(name=order)
-                        db.session.add(o)
-                        orders[order] = o
-                        scan.order = o
+    if 'csv' not in request.files:
+        abort(400, 'no CSV file uploaded')
 
-    db.session.commit()
-    return redirect(url_for('index'))
+    job = taxonomy.start(current_user, request.files['csv'])
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = url_for('taxonomyimport', job_id=job.id)
+    return response
 
 
 @app.route('/close/<int:dataset_id>')
@@ -363,6 +341,10 @@ def complete_search():
     # if form.validate_on_submit():
     #     pass
     query = request.args['q']
+
+    if search.health.available is False:
+        abort(503, 'search is currently not available')
+
     page = 1
     if 'page' in request.args:
         page = int(request.args['page'])
@@ -380,6 +362,7 @@ def complete_search():
 
 @app.route('/filter', methods = ['GET'])
 @app.route('/filter/<int:page>', methods=['GET'])
+@caching.cached_page(User, Dataset, Permission, SampleScan, Genus, Family, Order)
 def filter(page=1):
     samples = Permission.query.join(SampleScan).\
             filter(Permission.can_read == True)
@@ -440,14 +423,16 @@ def process(dataset_id):
 
 @app.route('/collection/<collection_name>')
 @login_required(admin=False)
+@caching.cached_page(User, Collection, Dataset, Permission, Review, Bookmark, models.Service)
 def show_collection(collection_name):
     collection= Collection.query.\
         filter(Collection.name == collection_name).first()
 
     if collection:
         service = resources.services.get('thumbnail-server')
+        datasets = logic.get_collection_datasets(collection).all()
         return render_template('collection/list.html', collection=collection,
-                thumbnail_service=service)
+                datasets=datasets, thumbnail_service=service)
 
     abort(404, 'collection {} not found'.format(collection_name))
 
@@ -461,37 +446,31 @@ def show_dataset(user, dataset, path=''):
             filter(Permission.owner == user).first()
     if dataset is None:
         abort(404, 'dataset {} not found'.format(dataset))
-    dataset_permissions = {}
-    name = None
-    permission = Permission.query.filter(Permission.dataset == dataset).first()
-    if permission:
-        if permission.can_read == True or permission.owner==current_user:
-            dataset_permissions = {'read': permission.can_read,
-                           'interact': permission.can_interact,
-                           'fork': permission.can_fork}
-    if dataset_permissions == {}:
-        direct_access = DirectAccess.query.\
-                      filter(DirectAccess.dataset == dataset).\
-                      filter(DirectAccess.user == current_user).\
-                      filter(DirectAccess.can_read == True).first()
-        if direct_access is None:
-            return render_template('base/accessrequest.html', access_name='read',
-                                   user=user, dataset=dataset,
-                                   collection=dataset.collection,
-                                   item={'type':'dataset', 'name':dataset,
-                                         'description':dataset.description,
-                                         'id':dataset.id,})
-        dataset_permissions = {'read': direct_access.can_read,
-                               'interact': direct_access.can_interact,
-                               'fork': direct_access.can_fork}
+    dataset_permissions = access.get_permissions(current_user, dataset)
+    if not dataset_permissions['read']:
+        return render_template('base/accessrequest.html', access_name='read',
+                               user=user, dataset=dataset,
+                               collection=dataset.collection,
+                               item={'type':'dataset', 'name':dataset,
+                                     'description':dataset.description,
+                                     'id':dataset.id,})
     if path:
-        filepath = os.path.join(dataset.path, path)
+        filepath = os.path.join(fs.path_of(dataset), path)
 
         if os.path.isfile(filepath):
             filename = os.path.basename(filepath)
             directory = os.path.dirname(filepath)
 
-            return send_from_directory(directory, filename)
+            # closed datasets can be reopened, always revalidate against the
+            # ETag and Last-Modified of the file
+            response = send_from_directory(directory, filename, conditional=True)
+            response.headers['Cache-Control'] = caching.NO_CACHE
+            digest = checksums.manifests.get(fs.path_of(dataset), os.path.normpath(path))
+
+            if digest is not None:
+                response.headers['X-Nova-Checksum'] = '{}={}'.format(checksums.algorithm(), digest)
+
+            return response
 
     # FIXME: check access rights
     # FIXME: scream if no dataset found
@@ -541,10 +520,8 @@ def delete(dataset_id=None):
 
     #TODO: Add notifications for deletion to bookmarks and forks
     if permission is not None and dataset is not None:
-        path = fs.path_of(dataset)
-        db.session.delete(dataset)
-        db.session.commit()
-        app.logger.info("Would remove {}, however deletion is currently disabled".format(path))
+        logic.delete_dataset(dataset)
+        tasks.collect_garbage.delay()
 
     return redirect(url_for('index'))
 
@@ -584,29 +561,14 @@ def wave(user, dataset):
             filter(Permission.owner == user).first()
     if dataset is None:
         abort(404, 'dataset {} not found'.format(dataset))
-    dataset_permissions = {}
-    name = None
-    permission = Permission.query.filter(Permission.dataset == dataset).first()
-    if permission:
-        if permission.can_read == True or permission.owner==current_user:
-            dataset_permissions = {'read': permission.can_read,
-                           'interact': permission.can_interact,
-                           'fork': permission.can_fork}
-    if dataset_permissions == {}:
-        direct_access = DirectAccess.query.\
-                      filter(DirectAccess.dataset == dataset).\
-                      filter(DirectAccess.user == current_user).\
-                      filter(DirectAccess.can_read == True).first()
-        if direct_access is None:
-            return render_template('base/accessrequest.html', access_name='read',
-                                   user=user, dataset=dataset,
-                                   collection=dataset.collection,
-                                   item={'type':'dataset', 'name':dataset,
-                                         'description':dataset.description,
-                                         'id':dataset.id,})
-        dataset_permissions = {'read': direct_access.can_read,
-                               'interact': direct_access.can_interact,
-                               'fork': direct_access.can_fork}
+    dataset_permissions = access.get_permissions(current_user, dataset)
+    if not dataset_permissions['read']:
+        return render_template('base/accessrequest.html', access_name='read',
+                               user=user, dataset=dataset,
+                               collection=dataset.collection,
+                               item={'type':'dataset', 'name':dataset,
+                                     'description':dataset.description,
+                                     'id':dataset.id,})
     return render_template('dataset/wave.html', owner=user, dataset=dataset,
                            collection=dataset.collection, token=token, ops=ops,
                            colormap=colormap, permissions=dataset_permissions) 
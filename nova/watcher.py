@@ -0,0 +1,283 @@
+import os
+import json
+import time
+from nova import app, db, models, logic, search, quota
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+
+METADATA = os.path.join('.nova', 'metadata.json')
+
+
+class Index(object):
+    # Sizes of all files per dataset so that a change only needs a stat of
+    # the changed file to keep the totals right.
+    def __init__(self):
+        self.datasets = {}
+
+    def add(self, dataset_id, path):
+        files = {}
+
+        for root, dirs, filenames in os.walk(path):
+            for filename in filenames:
+                name = os.path.join(root, filename)
+
+                try:
+                    files[name] = os.lstat(name).st_size
+                except OSError:
+                    pass
+
+        self.datasets[path] = (dataset_id, files)
+
+    def dataset_of(self, path):
+        while path and path != os.sep:
+            if path in self.datasets:
+                return path
+
+            path = os.path.dirname(path)
+
+    def update(self, path):
+        """Restat a changed path and return its dataset's path if it belongs
+        to one."""
+        dataset = self.dataset_of(path)
+
+        if dataset is None:
+            return None
+
+        files = self.datasets[dataset][1]
+
+        # a removed directory takes its files with it
+        prefix = path + os.sep
+
+        for name in [n for n in files if n == path or n.startswith(prefix)]:
+            del files[name]
+
+        if os.path.isdir(path):
+            names = (os.path.join(root, f) for root, _, filenames in os.walk(path) for f in filenames)
+        else:
+            names = [path]
+
+        for name in names:
+            try:
+                files[name] = os.lstat(name).st_size
+            except OSError:
+                pass
+
+        return dataset
+
+    def statistics(self, path):
+        dataset_id, files = self.datasets[path]
+        return dataset_id, len(files), sum(files.values())
+
+
+class Debouncer(object):
+    # Acquisition software writes thousands of files in bursts, handle them
+    # once writing paused for `delay' seconds but at least every `limit'.
+    def __init__(self, delay, limit):
+        self.delay = delay
+        self.limit = limit
+        self.paths = set()
+        self.first = None
+        self.last = None
+
+    def add(self, path):
+        now = time.time()
+        self.paths.add(path)
+        self.first = self.first or now
+        self.last = now
+
+    def due(self):
+        if not self.paths:
+            return set()
+
+        now = time.time()
+
+        if now - self.last < self.delay and now - self.first < self.limit:
+            return set()
+
+        paths, self.paths, self.first = self.paths, set(), None
+        return paths
+
+
+class PollingBackend(object):
+    def __init__(self, root, interval):
+        self.root = root
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = {}
+
+        for root, dirs, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(root, name)
+
+                try:
+                    stat = os.lstat(path)
+                    snapshot[path] = (stat.st_mtime, stat.st_size)
+                except OSError:
+                    pass
+
+        return snapshot
+
+    def poll(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        snapshot = self.scan()
+        changed = set(p for p, s in snapshot.items() if self.snapshot.get(p) != s)
+        changed.update(p for p in self.snapshot if p not in snapshot)
+        self.snapshot = snapshot
+        return changed
+
+
+class InotifyBackend(object):
+    def __init__(self, root):
+        paths = self.paths = set()
+
+        class Handler(pyinotify.ProcessEvent):
+            def process_default(self, event):
+                paths.add(event.pathname)
+
+        mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_CREATE | pyinotify.IN_DELETE | \
+            pyinotify.IN_MOVED_FROM | pyinotify.IN_MOVED_TO | pyinotify.IN_ATTRIB
+
+        self.manager = pyinotify.WatchManager()
+        self.notifier = pyinotify.Notifier(self.manager, Handler())
+        self.manager.add_watch(root, mask, rec=True, auto_add=True)
+
+    def poll(self, timeout):
+        if self.notifier.check_events(int(timeout * 1000)):
+            self.notifier.read_events()
+            self.notifier.process_events()
+
+        paths = set(self.paths)
+        self.paths.clear()
+        return paths
+
+
+class Watcher(object):
+    def __init__(self, root, polling=False):
+        self.root = os.path.abspath(root)
+        self.index = Index()
+        self.debouncer = Debouncer(app.config['NOVA_WATCH_DEBOUNCE'], app.config['NOVA_WATCH_MAX_DELAY'])
+
+        if pyinotify is None or polling:
+            self.backend = PollingBackend(self.root, app.config['NOVA_WATCH_POLL_INTERVAL'])
+        else:
+            self.backend = InotifyBackend(self.root)
+
+        for dataset_id, path in db.session.query(models.Dataset.id, models.Dataset.path):
+            if path and os.path.isdir(path):
+                self.index.add(dataset_id, path)
+
+        self.store(self.index.datasets.keys())
+
+    def store(self, paths):
+        for path in paths:
+            dataset_id, count, size = self.index.statistics(path)
+            dataset = models.Dataset.query.get(dataset_id)
+
+            if dataset is None:
+                del self.index.datasets[path]
+                continue
+
+            # data written behind nova's back counts towards the quotas too
+            quota.charge(dataset, size - (dataset.size or 0), count - (dataset.file_count or 0))
+
+        db.session.commit()
+
+    def register(self, metadata):
+        path = os.path.dirname(os.path.dirname(metadata))
+
+        if path in self.index.datasets:
+            return
+
+        try:
+            with open(metadata) as f:
+                info = json.load(f)
+        except (IOError, ValueError) as e:
+            app.logger.warning("Cannot read {}: {}".format(metadata, e))
+            return
+
+        owner = unicode(info.get('owner', ''))
+        user = models.User.query.filter(models.User.name == owner).first()
+
+        if user is None and owner.isdigit():
+            user = models.User.query.get(int(owner))
+
+        if user is None:
+            app.logger.warning("Not registering {}, unknown owner `{}'".format(path, owner))
+            return
+
+        name = info.get('name') or os.path.basename(path)
+        collection_name = info.get('collection') or app.config['NOVA_WATCH_COLLECTION']
+        collection = models.Collection.query.filter(models.Collection.name == collection_name).first()
+
+        if collection is None:
+            collection = logic.create_collection(collection_name, user)
+
+        dataset = logic.create_dataset(models.Dataset, name, user, collection, path=path)
+        app.logger.info("Registered {} as {}/{}".format(path, user.name, name))
+        self.index.add(dataset.id, path)
+        search.try_insert(dataset)
+
+    def discover(self, paths):
+        """Index datasets created since the start, e.g. through the web
+        interface, that contain any of paths."""
+        parents = set()
+
+        for path in paths:
+            if self.index.dataset_of(path) is not None:
+                continue
+
+            while path.startswith(self.root + os.sep) and path not in parents:
+                parents.add(path)
+                path = os.path.dirname(path)
+
+        parents = sorted(parents)
+
+        for i in range(0, len(parents), 500):
+            query = db.session.query(models.Dataset.id, models.Dataset.path).\
+                filter(models.Dataset.path.in_(parents[i:i + 500]))
+
+            for dataset_id, path in query:
+                if path not in self.index.datasets and os.path.isdir(path):
+                    self.index.add(dataset_id, path)
+
+    def handle(self, paths):
+        changed = set()
+
+        # before registering, which skips datasets that are known already
+        self.discover(paths)
+
+        if app.config['NOVA_WATCH_REGISTER']:
+            for path in paths:
+                if path.endswith(METADATA):
+                    self.register(path)
+
+        for path in paths:
+            dataset = self.index.update(path)
+
+            if dataset is not None:
+                changed.add(dataset)
+
+        if changed:
+            self.store(changed)
+
+    def run(self):
+        app.logger.info("Watching {} using {}".format(self.root, type(self.backend).__name__))
+
+        while True:
+            for path in self.backend.poll(self.debouncer.delay):
+                self.debouncer.add(path)
+
+            paths = self.debouncer.due()
+
+            if paths:
+                try:
+                    self.handle(paths)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception("Cannot handle {} changed paths".format(len(paths)))
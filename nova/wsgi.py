@@ -0,0 +1,3 @@
+from nova import create_app
+
+app = create_app()
@@ -28,12 +28,18 @@ setup(
         'Flask-Migrate',
         'flask-restful',
         'Flask-Script',
-        'Flask-SQLAlchemy',
+        'Flask-SQLAlchemy>=2.4',
         'flask-WTF',
         'jinja2',
         'passlib',
         'pyxdg',
         'requests',
+        'SQLAlchemy>=1.2',
         'SQLAlchemy-Utils',
         ],
+    extras_require={
+        'postgresql': ['psycopg2'],
+        'inotify': ['pyinotify'],
+        'checksums': ['xxhash'],
+    },
 )